@@ -1,27 +1,31 @@
+import csv
 import glob
-import json
-import math
 import os
 import re
 from datetime import datetime, timezone
 from decimal import Decimal, InvalidOperation
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+from pyarrow import csv as pacsv
 
-from utils_io import ensure_dir
-from utils_text import extract_domains, extract_hashtags, extract_urls, hash_id, normalize_text_basic
+from utils_io import ensure_dir, write_jsonl, write_jsonl_rows
+from utils_text import HASHTAG_RE, URL_RE, WHITESPACE_RE, extract_domains, hash_id
 
 
 IN_GLOB = "data/*.csv"
 OUT_COMMENTS = "data/comments.jsonl"
 OUT_VIDEOS = "data/videos.jsonl"
-CHUNK_SIZE = 50000
+OUT_USER_ITEMS = "data/user_items.jsonl"  # per-user ARL items, read by 04/05 instead of re-parsing comments
+CSV_BLOCK_SIZE = 64 << 20  # bytes of CSV parsed per Arrow record batch
 
 USER_ID_RE = re.compile(r"'id':\s*([0-9]+)")
 HASHTAG_TEXT_RE = re.compile(r"'text':\s*'([^']+)'")
 MENTION_SN_RE = re.compile(r"'screen_name':\s*'([^']+)'")
 MENTION_TEXT_RE = re.compile(r"@([A-Za-z0-9_]{1,50})")
 TWEET_ID_RE = re.compile(r"'id':\s*([0-9]+)")
+NAN_STRINGS = ["nan", "naN", "nAn", "nAN", "Nan", "NaN", "NAn", "NAN"]  # every casing of "nan"
 
 
 def normalize_id(value: object) -> str:
@@ -32,7 +36,7 @@ def normalize_id(value: object) -> str:
         return ""
     if s.endswith(".0"):
         s = s[:-2]
-    if "e" in s.lower():
+    if "e" in s or "E" in s:
         try:
             d = Decimal(s)
             return str(int(d))
@@ -41,41 +45,6 @@ def normalize_id(value: object) -> str:
     return s
 
 
-def extract_user_id(user_field: object) -> str:
-    if not user_field:
-        return ""
-    m = USER_ID_RE.search(str(user_field))
-    return m.group(1) if m else ""
-
-
-def extract_hashtags_from_field(field: object) -> list[str]:
-    if not field:
-        return []
-    tags = [t.lower() for t in HASHTAG_TEXT_RE.findall(str(field))]
-    return list(dict.fromkeys(tags))
-
-
-def extract_mentions_from_field(field: object) -> list[str]:
-    if not field:
-        return []
-    mentions = [m.lower() for m in MENTION_SN_RE.findall(str(field))]
-    return list(dict.fromkeys(mentions))
-
-
-def extract_mentions_from_text(text: str) -> list[str]:
-    if not text:
-        return []
-    mentions = [m.lower() for m in MENTION_TEXT_RE.findall(text)]
-    return list(dict.fromkeys(mentions))
-
-
-def extract_tweet_id(field: object) -> str:
-    if not field:
-        return ""
-    m = TWEET_ID_RE.search(str(field))
-    return m.group(1) if m else ""
-
-
 def parse_date_string(value: str) -> str | None:
     if not value:
         return None
@@ -89,30 +58,159 @@ def parse_date_string(value: str) -> str | None:
     return dt.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
 
 
-def parse_epoch(epoch_value: object, date_value: object) -> str | None:
-    if epoch_value is not None and str(epoch_value).strip():
-        try:
-            ts = float(epoch_value)
-            if not math.isnan(ts):
-                dt = datetime.fromtimestamp(ts, tz=timezone.utc)
-                return dt.strftime("%Y-%m-%dT%H:%M:%SZ")
-        except (ValueError, TypeError):
-            pass
-    if date_value is not None and str(date_value).strip():
-        return parse_date_string(str(date_value).strip())
-    return None
-
-
-def to_int(value: object) -> int:
-    if value is None:
-        return 0
-    s = str(value).strip()
-    if not s or s.lower() == "nan":
-        return 0
-    try:
-        return int(float(s))
-    except ValueError:
-        return 0
+def iter_csv_chunks(path: str):
+    """Stream a memory-mapped CSV as all-string DataFrames using Arrow's multithreaded parser."""
+    # utf-8-sig: Arrow drops a leading BOM from the first column name, so the header must too.
+    with open(path, "r", encoding="utf-8-sig", newline="") as f:
+        header = next(csv.reader(f), [])
+    # Memory-mapped input: Arrow parses straight from the page cache, no read() copies.
+    with pa.memory_map(path, "r") as source:
+        reader = pacsv.open_csv(
+            source,
+            read_options=pacsv.ReadOptions(block_size=CSV_BLOCK_SIZE, use_threads=True),
+            parse_options=pacsv.ParseOptions(newlines_in_values=True),
+            convert_options=pacsv.ConvertOptions(column_types={name: pa.string() for name in header}),
+        )
+        for batch in reader:
+            yield batch.to_pandas()
+
+
+def column(chunk: pd.DataFrame, *names: str) -> pd.Series:
+    """Row-wise `row[a] or row[b] or ...` over the given columns (missing columns are skipped)."""
+    out = pd.Series("", index=chunk.index, dtype=object)
+    for name in reversed(names):
+        if name in chunk.columns:
+            s = chunk[name]
+            out = s.where(s != "", out)
+    return out
+
+
+def normalize_id_series(values: pd.Series) -> pd.Series:
+    s = values.str.strip()
+    s = s.mask(s.isin(NAN_STRINGS), "")
+    s = s.str.replace(r"\.0$", "", regex=True)
+    sci = s.str.contains("e", case=False, regex=False)
+    if sci.any():
+        # Float-formatted IDs lose digits as float64; keep the exact Decimal path for those cells.
+        s = s.mask(sci, values[sci].map(normalize_id))
+    return s
+
+
+def to_int_series(values: pd.Series) -> pd.Series:
+    n = pd.to_numeric(values.str.strip(), errors="coerce")
+    return n.replace([np.inf, -np.inf], np.nan).fillna(0).astype("int64")
+
+
+def parse_epoch_series(epoch: pd.Series, date: pd.Series) -> pd.Series:
+    ts = pd.to_numeric(epoch.str.strip(), errors="coerce")
+    dt = pd.to_datetime(ts, unit="s", utc=True, errors="coerce")
+    out = dt.dt.strftime("%Y-%m-%dT%H:%M:%SZ").astype(object)
+    missing = out.isna()
+    if missing.any():
+        out[missing] = date[missing].str.strip().map(parse_date_string)
+    return out.where(out.notna(), None)
+
+
+def hash_series(values: pd.Series, salt: str) -> pd.Series:
+    """hash_id over a Series, hashing each distinct value once."""
+    codes, uniques = pd.factorize(values)
+    hashed = np.array([hash_id(u, salt=salt) for u in uniques], dtype=object)
+    return pd.Series(hashed[codes], index=values.index, dtype=object)
+
+
+def unique(values: list[str]) -> list[str]:
+    return list(dict.fromkeys(values))
+
+
+def clean_urls(urls: list[str]) -> list[str]:
+    return list({u.rstrip(".,;:!?)\"'"): None for u in urls})
+
+
+def lower_unique(*groups: list[str]) -> list[str]:
+    return list({v.lower(): None for values in groups for v in values})
+
+
+def transform_chunk(chunk: pd.DataFrame) -> pd.DataFrame:
+    chunk = chunk.fillna("")
+
+    tweet_id = normalize_id_series(column(chunk, "id_str", "id"))
+    conv_raw = column(chunk, "conversationIdStr", "conversationId")
+    conv_id = normalize_id_series(conv_raw.where(conv_raw != "", tweet_id))
+
+    user_id = normalize_id_series(column(chunk, "user_id"))
+    user_field = column(chunk, "user").str.extract(USER_ID_RE, expand=False).fillna("")
+    user_id = user_id.where(user_id != "", user_field)
+
+    keep = (tweet_id != "") & (user_id != "")
+    if not keep.all():
+        chunk = chunk[keep]
+        tweet_id, conv_id, user_id = tweet_id[keep], conv_id[keep], user_id[keep]
+
+    text = column(chunk, "rawContent", "text").str.strip().str.replace(WHITESPACE_RE, " ", regex=True)
+    tweet_url = column(chunk, "url")
+
+    quoted_id = normalize_id_series(column(chunk, "quotedTweetID", "quotedTweetId"))
+    quoted_field = column(chunk, "quotedTweet").str.extract(TWEET_ID_RE, expand=False).fillna("")
+    quoted_id = quoted_id.where(quoted_id != "", quoted_field)
+
+    all_urls = []
+    all_links = []
+    all_domains = []
+    all_hashtags = []
+    all_mentions = []
+    for t_url, url_hits, link_hits, tag_hits, tag_field, ment_hits, ment_field in zip(
+        tweet_url,
+        text.str.findall(URL_RE),
+        column(chunk, "links").str.findall(URL_RE),
+        text.str.findall(HASHTAG_RE),
+        column(chunk, "hashtags").str.findall(HASHTAG_TEXT_RE),
+        text.str.findall(MENTION_TEXT_RE),
+        column(chunk, "mentionedUsers").str.findall(MENTION_SN_RE),
+    ):
+        urls = clean_urls(url_hits)
+        if t_url and t_url not in urls:
+            urls = [t_url] + urls
+        extra_urls = clean_urls(link_hits)
+        if extra_urls:
+            urls = unique(urls + extra_urls)
+        all_urls.append(urls)
+        all_links.append(extra_urls)
+        all_domains.append(extract_domains(urls))
+        all_hashtags.append(lower_unique(tag_hits, tag_field))
+        all_mentions.append(lower_unique(ment_hits, ment_field))
+
+    return pd.DataFrame({
+        "video_id": conv_id,
+        "conversation_id": conv_id,
+        "comment_id": tweet_id,
+        "author_id": hash_series(user_id, salt="tw-osint"),
+        "published_at": parse_epoch_series(column(chunk, "epoch"), column(chunk, "date")),
+        "text": text,
+        "urls": all_urls,
+        "links": all_links,
+        "domains": all_domains,
+        "hashtags": all_hashtags,
+        "mentions": all_mentions,
+        "retweeted_tweet_id": normalize_id_series(column(chunk, "retweetedTweetID")),
+        "retweeted_user_id": normalize_id_series(column(chunk, "retweetedUserID")),
+        "quoted_tweet_id": quoted_id,
+        "in_reply_to_status_id_str": normalize_id_series(column(chunk, "in_reply_to_status_id_str")),
+        "lang": column(chunk, "lang"),
+        "like_count": to_int_series(column(chunk, "likeCount")),
+        "reply_count": to_int_series(column(chunk, "replyCount")),
+        "retweet_count": to_int_series(column(chunk, "retweetCount")),
+        "quote_count": to_int_series(column(chunk, "quoteCount")),
+        "view_count": to_int_series(column(chunk, "viewCount")),
+        "tweet_type": column(chunk, "type", "_type"),
+        "tweet_url": tweet_url,
+    }, index=chunk.index)
+
+
+def iter_records(df: pd.DataFrame):
+    """Row dicts with native Python values; zips column lists instead of to_dict/iterrows."""
+    cols = df.columns.tolist()
+    for row in zip(*(df[c].tolist() for c in cols)):
+        yield dict(zip(cols, row))
 
 
 def main() -> None:
@@ -125,102 +223,57 @@ def main() -> None:
     total = 0
     kept = 0
     conv_to_channel: dict[str, str] = {}
+    user_acc: dict[str, dict] = {}
 
-    with open(OUT_COMMENTS, "w", encoding="utf-8") as fout:
+    with open(OUT_COMMENTS, "wb", buffering=4 << 20) as fout:
         for path in files:
-            for chunk in pd.read_csv(path, chunksize=CHUNK_SIZE, dtype=str, keep_default_na=False):
-                for _, row in chunk.iterrows():
-                    tweet_id = normalize_id(row.get("id_str") or row.get("id"))
-                    if not tweet_id:
-                        continue
-
-                    conv_id = normalize_id(
-                        row.get("conversationIdStr") or row.get("conversationId") or tweet_id
-                    )
-
-                    user_id = normalize_id(row.get("user_id"))
-                    if not user_id:
-                        user_id = extract_user_id(row.get("user"))
-                    if not user_id:
-                        continue
-
-                    author_id = hash_id(user_id, salt="tw-osint")
-
-                    text = row.get("rawContent") or row.get("text") or ""
-                    text = normalize_text_basic(text)
-
-                    published_at = parse_epoch(row.get("epoch"), row.get("date"))
-
-                    urls = extract_urls(text)
-                    tweet_url = row.get("url") or ""
-                    if tweet_url and tweet_url not in urls:
-                        urls = [tweet_url] + urls
-                    links_field = row.get("links")
-                    extra_urls = extract_urls(str(links_field)) if links_field else []
-                    if extra_urls:
-                        urls = list(dict.fromkeys(urls + extra_urls))
-                    domains = extract_domains(urls)
-                    hashtags = extract_hashtags(text)
-                    extra_tags = extract_hashtags_from_field(row.get("hashtags"))
-                    if extra_tags:
-                        hashtags = list(dict.fromkeys(hashtags + extra_tags))
-
-                    mentions = extract_mentions_from_text(text)
-                    extra_mentions = extract_mentions_from_field(row.get("mentionedUsers"))
-                    if extra_mentions:
-                        mentions = list(dict.fromkeys(mentions + extra_mentions))
-
-                    retweet_id = normalize_id(row.get("retweetedTweetID"))
-                    retweet_user_id = normalize_id(row.get("retweetedUserID"))
-                    quoted_id = normalize_id(row.get("quotedTweetID") or row.get("quotedTweetId"))
-                    if not quoted_id:
-                        quoted_id = extract_tweet_id(row.get("quotedTweet"))
-
-                    in_reply_to = normalize_id(row.get("in_reply_to_status_id_str"))
-
-                    out = {
-                        "video_id": conv_id,
-                        "conversation_id": conv_id,
-                        "comment_id": tweet_id,
-                        "author_id": author_id,
-                        "published_at": published_at,
-                        "text": text,
-                        "urls": urls,
-                        "links": extra_urls,
-                        "domains": domains,
-                        "hashtags": hashtags,
-                        "mentions": mentions,
-                        "retweeted_tweet_id": retweet_id,
-                        "retweeted_user_id": retweet_user_id,
-                        "quoted_tweet_id": quoted_id,
-                        "in_reply_to_status_id_str": in_reply_to,
-                        "lang": row.get("lang") or "",
-                        "like_count": to_int(row.get("likeCount")),
-                        "reply_count": to_int(row.get("replyCount")),
-                        "retweet_count": to_int(row.get("retweetCount")),
-                        "quote_count": to_int(row.get("quoteCount")),
-                        "view_count": to_int(row.get("viewCount")),
-                        "tweet_type": row.get("type") or row.get("_type") or "",
-                        "tweet_url": tweet_url,
-                    }
-
-                    fout.write(json.dumps(out, ensure_ascii=False) + "\n")
-                    kept += 1
-                    total += 1
+            for chunk in iter_csv_chunks(path):
+                df = transform_chunk(chunk)
+                write_jsonl_rows(fout, iter_records(df))
+                kept += len(df)
+                total += len(df)
 
+                for conv_id, channel_id in zip(df["video_id"], df["author_id"]):
                     if conv_id and conv_id not in conv_to_channel:
-                        conv_to_channel[conv_id] = author_id
+                        conv_to_channel[conv_id] = channel_id
+
+                for u, conv_id, doms, tags, mentions in zip(
+                    df["author_id"], df["video_id"], df["domains"], df["hashtags"], df["mentions"]
+                ):
+                    acc = user_acc.get(u)
+                    if acc is None:
+                        acc = user_acc[u] = {"comments": 0, "with_domains": 0, "convs": set(), "items": set()}
+                    acc["comments"] += 1
+                    acc["convs"].add(conv_id)
+                    if doms:
+                        acc["with_domains"] += 1
+                        acc["items"].update(f"DOM:{d}" for d in doms if d)
+                    acc["items"].update(f"TAG:{t}" for t in tags if t)
+                    acc["items"].update(f"MENT:{m}" for m in mentions if m)
 
             print(f"[OK] Processed: {path}")
 
-    with open(OUT_VIDEOS, "w", encoding="utf-8") as fvid:
-        for conv_id, channel_id in conv_to_channel.items():
-            row = {"video_id": conv_id, "channel_id": channel_id, "source": "twitter"}
-            fvid.write(json.dumps(row, ensure_ascii=False) + "\n")
+    write_jsonl(OUT_VIDEOS, (
+        {"video_id": conv_id, "channel_id": channel_id, "source": "twitter"}
+        for conv_id, channel_id in conv_to_channel.items()
+    ))
+
+    def user_item_rows():
+        for u, acc in user_acc.items():
+            channels = {f"CH:{conv_to_channel[c]}" for c in acc["convs"] if c in conv_to_channel}
+            yield {
+                "author_id": u,
+                "comments": acc["comments"],
+                "comments_with_domains": acc["with_domains"],
+                "items": sorted(channels | acc["items"]),
+            }
+
+    write_jsonl(OUT_USER_ITEMS, user_item_rows())
 
     print(f"Total tweets read: {total}")
     print(f"Saved: {OUT_COMMENTS}")
     print(f"Conversations saved: {OUT_VIDEOS} ({len(conv_to_channel)})")
+    print(f"User items saved: {OUT_USER_ITEMS} ({len(user_acc)})")
 
 
 if __name__ == "__main__":
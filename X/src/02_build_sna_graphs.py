@@ -1,36 +1,52 @@
 import os
 import json
+import igraph as ig
 import networkx as nx
-from collections import defaultdict
-from community import community_louvain
+import numpy as np
+import orjson
+import pyarrow as pa
+import pyarrow.parquet as pq
+import scipy.sparse as sp
+from utils_io import write_jsonl
 
 COMMENTS_IN = "data/comments_filtered.jsonl"
 COMMENTS_FALLBACK = "data/comments.jsonl"
 OUT_BIP = "data/graph_user_video.gexf"
+OUT_UU_EDGES = "data/graph_user_user_edges.parquet"  # src, dst (node ids), weight
+OUT_UU_NODES = "data/graph_user_user_nodes.jsonl"  # id, author_id, community
 OUT_UU = "data/graph_user_user.gexf"
 OUT_STATS = "data/sna_stats.json"
 MIN_SHARED = 5
 MIN_UV = 5
+WRITE_GEXF = False  # also export the user-user graph as GEXF (Gephi etc.)
 
 
 def main():
-    # user-video bipartite edges: (user, video) -> count
-    uv = defaultdict(int)
-    users = set()
-    videos = set()
+    # Users and videos get contiguous ids on first sight; one (user, video) pair per comment.
+    user_idx: dict[str, int] = {}
+    video_idx: dict[str, int] = {}
+    u_ids = []
+    v_ids = []
 
     in_path = COMMENTS_IN if os.path.exists(COMMENTS_IN) else COMMENTS_FALLBACK
     if not os.path.exists(in_path):
         raise FileNotFoundError(f"Missing input file: {COMMENTS_IN} (fallback: {COMMENTS_FALLBACK})")
 
-    with open(in_path, "r", encoding="utf-8") as f:
+    with open(in_path, "rb", buffering=1 << 20) as f:
         for line in f:
-            r = json.loads(line)
-            u = r["author_id"]
-            v = r["video_id"]
-            uv[(u, v)] += 1
-            users.add(u)
-            videos.add(v)
+            r = orjson.loads(line)
+            u_ids.append(user_idx.setdefault(r["author_id"], len(user_idx)))
+            v_ids.append(video_idx.setdefault(r["video_id"], len(video_idx)))
+
+    users = list(user_idx)
+    videos = list(video_idx)
+
+    # user-video comment counts: duplicates summed by the COO -> CSR conversion
+    uv = sp.coo_matrix(
+        (np.ones(len(u_ids), dtype=np.int32), (np.asarray(u_ids, dtype=np.int64), np.asarray(v_ids, dtype=np.int64))),
+        shape=(len(users), len(videos)),
+    ).tocsr()
+    uv_coo = uv.tocoo()
 
     # Bipartite graph
     B = nx.Graph()
@@ -38,9 +54,11 @@ def main():
         B.add_node(u, node_type="user")
     for v in videos:
         B.add_node(v, node_type="video")
-    for (u, v), w in uv.items():
-        if w >= MIN_UV:
-            B.add_edge(u, v, weight=w)
+    strong = uv_coo.data >= MIN_UV
+    B.add_weighted_edges_from(
+        (users[i], videos[j], w)
+        for i, j, w in zip(uv_coo.row[strong].tolist(), uv_coo.col[strong].tolist(), uv_coo.data[strong].tolist())
+    )
 
     nx.write_gexf(B, OUT_BIP)
     print(f"[OK] Bipartite graph saved: {OUT_BIP}")
@@ -48,50 +66,49 @@ def main():
     print(f"     Users={len(users)} Videos={len(videos)}")
 
     # User-user projection: weight = number of shared videos (co-comment)
-    # For each video: connect all users who commented on it
-    video_to_users = defaultdict(list)
-    for (u, v), _w in uv.items():
-        video_to_users[v].append(u)
-
-    UU = nx.Graph()
-    for u in users:
-        UU.add_node(u, node_type="user")
-
-    # accumulate shared videos count
-    shared = defaultdict(int)
-    for v, ulist in video_to_users.items():
-        ulist = list(dict.fromkeys(ulist))
-        n = len(ulist)
-        for i in range(n):
-            for j in range(i + 1, n):
-                a, b = ulist[i], ulist[j]
-                if a > b:
-                    a, b = b, a
-                shared[(a, b)] += 1
-
-    for (a, b), w in shared.items():
-        if w >= MIN_SHARED:
-            UU.add_edge(a, b, weight=int(w))
-
-    # SNA stats
-    density = nx.density(UU)
-    avg_clust = nx.average_clustering(UU)
-
-    # Louvain
-    part = community_louvain.best_partition(UU, weight="weight")
-    nx.set_node_attributes(UU, part, "community")
-    modularity = community_louvain.modularity(part, UU, weight="weight")
-    n_comms = len(set(part.values()))
-
-    nx.write_gexf(UU, OUT_UU)
-    print(f"[OK] User-user graph saved: {OUT_UU}")
-    print(f"     Nodes={UU.number_of_nodes()}  Edges={UU.number_of_edges()}")
+    # With M the binary user x video incidence matrix, (M @ M.T)[a, b] counts
+    # the videos both a and b commented on; keep the upper triangle only.
+    M = uv.copy()
+    M.data[:] = 1
+    shared = sp.triu(M @ M.T, k=1).tocoo()
+    keep = shared.data >= MIN_SHARED
+    src = shared.row[keep].astype(np.int32)
+    dst = shared.col[keep].astype(np.int32)
+    weight = shared.data[keep].astype(np.int32)
+    edges = list(zip(src.tolist(), dst.tolist()))
+    weights = weight.tolist()
+
+    # SNA stats + Louvain run on igraph (C core); indices match users.
+    g = ig.Graph(n=len(users), edges=edges, edge_attrs={"weight": weights})
+    density = g.density()
+    avg_clust = g.transitivity_avglocal_undirected(mode="zero")
+
+    part = g.community_multilevel(weights="weight")
+    modularity = g.modularity(part.membership, weights="weight")
+    n_comms = len(part)
+
+    # Parquet edge list + JSONL node attrs are what 03/06 read; GEXF is export-only.
+    pq.write_table(pa.table({"src": src, "dst": dst, "weight": weight}), OUT_UU_EDGES)
+    write_jsonl(OUT_UU_NODES, (
+        {"id": i, "author_id": u, "community": cid}
+        for i, (u, cid) in enumerate(zip(users, part.membership))
+    ))
+    print(f"[OK] User-user graph saved: {OUT_UU_EDGES} + {OUT_UU_NODES}")
+    print(f"     Nodes={len(users)}  Edges={len(edges)}")
     print(f"     Density={density:.6f}  AvgClustering={avg_clust:.4f}")
     print(f"     Louvain communities={n_comms}  Modularity={modularity:.4f}")
 
+    if WRITE_GEXF:
+        UU = nx.Graph()
+        for u, cid in zip(users, part.membership):
+            UU.add_node(u, node_type="user", community=cid)
+        UU.add_weighted_edges_from((users[a], users[b], w) for (a, b), w in zip(edges, weights))
+        nx.write_gexf(UU, OUT_UU)
+        print(f"[OK] GEXF export saved: {OUT_UU}")
+
     stats = {
-        "nodes": UU.number_of_nodes(),
-        "edges": UU.number_of_edges(),
+        "nodes": len(users),
+        "edges": len(edges),
         "density": density,
         "avg_clustering": avg_clust,
         "communities": n_comms,
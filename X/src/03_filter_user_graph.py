@@ -1,28 +1,45 @@
 import networkx as nx
-
-IN_GEXF = "data/graph_user_user.gexf"
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from utils_io import read_jsonl
+
+IN_EDGES = "data/graph_user_user_edges.parquet"
+IN_NODES = "data/graph_user_user_nodes.jsonl"
+OUT_EDGES = "data/graph_user_user_w2_edges.parquet"  # node ids index IN_NODES
 OUT_GEXF = "data/graph_user_user_w2.gexf"
 
 MIN_W = 5  # keep only strong ties: shared videos >= 5
+WRITE_GEXF = False  # also export the filtered graph as GEXF (Gephi etc.)
 
 def main():
-    G = nx.read_gexf(IN_GEXF)
-
-    H = nx.Graph()
-    for u, v, d in G.edges(data=True):
-        w = int(float(d.get("weight", 1)))
-        if w >= MIN_W:
-            H.add_edge(u, v, weight=w)
-
-    for n in H.nodes():
-        if n in G.nodes():
-            H.nodes[n].update(G.nodes[n])
-
-    print("Original:", G.number_of_nodes(), "nodes,", G.number_of_edges(), "edges")
-    print("Filtered:", H.number_of_nodes(), "nodes,", H.number_of_edges(), "edges", f"(min_w={MIN_W})")
-
-    nx.write_gexf(H, OUT_GEXF)
-    print("Saved:", OUT_GEXF)
+    t = pq.read_table(IN_EDGES)
+    src = t["src"].to_numpy()
+    dst = t["dst"].to_numpy()
+    weight = t["weight"].to_numpy()
+    n_nodes = sum(1 for _ in read_jsonl(IN_NODES))
+
+    keep = weight >= MIN_W
+    src, dst, weight = src[keep], dst[keep], weight[keep]
+    kept_nodes = np.unique(np.concatenate([src, dst]))
+
+    print("Original:", n_nodes, "nodes,", t.num_rows, "edges")
+    print("Filtered:", len(kept_nodes), "nodes,", len(weight), "edges", f"(min_w={MIN_W})")
+
+    pq.write_table(pa.table({"src": src, "dst": dst, "weight": weight}), OUT_EDGES)
+    print("Saved:", OUT_EDGES)
+
+    if WRITE_GEXF:
+        nodes = {r["id"]: r for r in read_jsonl(IN_NODES)}
+        H = nx.Graph()
+        H.add_weighted_edges_from(
+            (nodes[a]["author_id"], nodes[b]["author_id"], w)
+            for a, b, w in zip(src.tolist(), dst.tolist(), weight.tolist())
+        )
+        for a in kept_nodes.tolist():
+            H.nodes[nodes[a]["author_id"]].update(node_type="user", community=nodes[a]["community"])
+        nx.write_gexf(H, OUT_GEXF)
+        print("Saved:", OUT_GEXF)
 
 if __name__ == "__main__":
     main()
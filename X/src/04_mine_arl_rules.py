@@ -1,13 +1,16 @@
-import json
+import orjson
 import os
+import numpy as np
 import pandas as pd
+import scipy.sparse as sp
 from collections import defaultdict
-from mlxtend.preprocessing import TransactionEncoder
 from mlxtend.frequent_patterns import association_rules, fpgrowth
+from utils_io import read_jsonl
 
 COMMENTS_IN = "data/comments.jsonl"
 COMMENTS_FALLBACK = "data/comments_filtered.jsonl"
 VIDEOS_META = "data/videos.jsonl"
+USER_ITEMS = "data/user_items.jsonl"
 
 OUT_RULES = "data/arl_rules_fixed.csv"
 OUT_FREQ  = "data/arl_frequent_itemsets_fixed.csv"
@@ -18,70 +21,94 @@ MIN_LIFT = 1.1
 MAX_ITEMS_PER_TX = 80
 MAX_ITEMS_GLOBAL = 3000
 
+# Element-wise over object arrays of frozensets (cheaper than Series.apply).
+itemset_len = np.vectorize(len, otypes=[np.int64])
+join_sorted = np.vectorize(lambda s: ", ".join(sorted(s)), otypes=[object])
+
 def load_video_to_channel():
     v2c = {}
-    with open(VIDEOS_META, "r", encoding="utf-8") as f:
+    with open(VIDEOS_META, "rb", buffering=1 << 20) as f:
         for line in f:
-            r = json.loads(line)
+            r = orjson.loads(line)
             vid = r.get("video_id")
             ch  = r.get("channel_id")
             if vid and ch:
                 v2c[vid] = ch
     return v2c
 
-def main():
-    v2c = load_video_to_channel()
+def scan_comments(in_path, v2c):
     tx = defaultdict(set)
-
     total = 0
     has_domains = 0
-
-    in_path = COMMENTS_IN if os.path.exists(COMMENTS_IN) else COMMENTS_FALLBACK
-    if not os.path.exists(in_path):
-        raise FileNotFoundError(f"Missing input file: {COMMENTS_IN} (fallback: {COMMENTS_FALLBACK})")
-
-    with open(in_path, "r", encoding="utf-8") as f:
+    with open(in_path, "rb", buffering=1 << 20) as f:
         for line in f:
             total += 1
-            r = json.loads(line)
+            r = orjson.loads(line)
             u = r["author_id"]
             vid = r["video_id"]
 
+            # Items are already lowercased by 01_ingest_x_csv.py.
             ch = v2c.get(vid)
-            if ch:
-                tx[u].add(f"CH:{ch}")
-
-            doms = r.get("domains", [])
+            items = [f"CH:{ch}"] if ch else []
+            doms = r.get("domains") or ()
             if doms:
                 has_domains += 1
-                for d in doms:
-                    if d:
-                        tx[u].add(f"DOM:{d.lower()}")
-
-            tags = r.get("hashtags", [])
-            if tags:
-                for t in tags:
-                    if t:
-                        tx[u].add(f"TAG:{t.lower()}")
-
-            mentions = r.get("mentions", [])
-            if mentions:
-                for m in mentions:
-                    if m:
-                        tx[u].add(f"MENT:{m.lower()}")
-
-    item_counts = defaultdict(int)
-    for items in tx.values():
-        for it in items:
-            item_counts[it] += 1
+            items += [f"DOM:{d}" for d in doms if d]
+            items += [f"TAG:{t}" for t in r.get("hashtags") or () if t]
+            items += [f"MENT:{m}" for m in r.get("mentions") or () if m]
+            if items:
+                tx[u].update(items)
+    return tx, total, has_domains
+
+def load_user_items():
+    """Per-user transactions precomputed by 01_ingest_x_csv.py."""
+    tx = {}
+    total = 0
+    has_domains = 0
+    for r in read_jsonl(USER_ITEMS):
+        tx[r["author_id"]] = set(r["items"])
+        total += r["comments"]
+        has_domains += r["comments_with_domains"]
+    return tx, total, has_domains
+
+def user_items_fresh(in_path):
+    return (
+        in_path == COMMENTS_IN
+        and os.path.exists(USER_ITEMS)
+        and os.path.getmtime(USER_ITEMS) >= os.path.getmtime(COMMENTS_IN)
+    )
+
+def main():
+    in_path = COMMENTS_IN if os.path.exists(COMMENTS_IN) else COMMENTS_FALLBACK
+    if not os.path.exists(in_path):
+        raise FileNotFoundError(f"Missing input file: {COMMENTS_IN} (fallback: {COMMENTS_FALLBACK})")
+
+    if user_items_fresh(in_path):
+        tx, total, has_domains = load_user_items()
+    else:
+        tx, total, has_domains = scan_comments(in_path, load_video_to_channel())
+
+    # Item frequencies: contiguous item ids + one bincount over all (user, item) occurrences.
+    item_idx = {}
+    occurrences = [item_idx.setdefault(it, len(item_idx)) for items in tx.values() for it in items]
+    item_names = list(item_idx)
+    item_counts = np.bincount(np.asarray(occurrences, dtype=np.int64), minlength=len(item_names))
 
     n_users = len(tx)
     min_count = max(1, int(MIN_SUPPORT * n_users))
-    keep_items = {it for it, c in item_counts.items() if c >= min_count}
-
-    if MAX_ITEMS_GLOBAL and len(keep_items) > MAX_ITEMS_GLOBAL:
-        top_items = sorted(keep_items, key=lambda x: item_counts.get(x, 0), reverse=True)
-        keep_items = set(top_items[:MAX_ITEMS_GLOBAL])
+    keep_ids = np.flatnonzero(item_counts >= min_count)
+
+    if MAX_ITEMS_GLOBAL and len(keep_ids) > MAX_ITEMS_GLOBAL:
+        # Top-K by count in O(n): partition for the K-th largest count, keep everything
+        # above it and fill the remaining slots with ties in first-seen order.
+        counts = item_counts[keep_ids]
+        kth = len(counts) - MAX_ITEMS_GLOBAL
+        cutoff = np.partition(counts, kth)[kth]
+        above = counts > cutoff
+        ties = np.flatnonzero(counts == cutoff)[:MAX_ITEMS_GLOBAL - int(above.sum())]
+        above[ties] = True
+        keep_ids = keep_ids[above]
+    keep_items = {item_names[i] for i in keep_ids.tolist()}
 
     transactions = []
     for _, items in tx.items():
@@ -95,19 +122,26 @@ def main():
     print("Transactions (per user):", len(transactions))
     print("Comments with domains:", has_domains, f"({has_domains/total:.2%})")
 
-    print("Unique items:", len(item_counts))
+    print("Unique items:", len(item_names))
     print("Kept items:", len(keep_items), "Min count:", min_count)
 
-    te = TransactionEncoder()
-    te_ary = te.fit(transactions).transform(transactions, sparse=True)
-    df = pd.DataFrame.sparse.from_spmatrix(te_ary, columns=te.columns_)
+    # One-hot CSR built straight from item indices (same sorted columns TransactionEncoder used).
+    columns = sorted({it for items in transactions for it in items})
+    col_idx = {it: j for j, it in enumerate(columns)}
+    rows = np.repeat(np.arange(len(transactions)), [len(items) for items in transactions])
+    cols = np.fromiter((col_idx[it] for items in transactions for it in items), dtype=np.int64, count=len(rows))
+    onehot = sp.csr_matrix(
+        (np.ones(len(rows), dtype=bool), (rows, cols)),
+        shape=(len(transactions), len(columns)),
+    )
+    df = pd.DataFrame.sparse.from_spmatrix(onehot, columns=columns)
 
     freq = fpgrowth(df, min_support=MIN_SUPPORT, use_colnames=True)
     if len(freq) == 0:
         print("No frequent itemsets. Lower MIN_SUPPORT.")
         return
 
-    freq["itemset_len"] = freq["itemsets"].apply(lambda s: len(s))
+    freq["itemset_len"] = itemset_len(freq["itemsets"].to_numpy())
     freq = freq.sort_values(["itemset_len", "support"], ascending=[False, False])
     freq.to_csv(OUT_FREQ, index=False)
     print("Frequent itemsets saved:", OUT_FREQ, "count:", len(freq))
@@ -121,8 +155,8 @@ def main():
     rules = rules[rules["lift"] >= MIN_LIFT].copy()
     rules = rules.sort_values(["lift", "confidence", "support"], ascending=[False, False, False])
 
-    rules["antecedents"] = rules["antecedents"].apply(lambda s: ", ".join(sorted(list(s))))
-    rules["consequents"] = rules["consequents"].apply(lambda s: ", ".join(sorted(list(s))))
+    rules["antecedents"] = join_sorted(rules["antecedents"].to_numpy())
+    rules["consequents"] = join_sorted(rules["consequents"].to_numpy())
 
     rules.to_csv(OUT_RULES, index=False)
     print("Rules saved:", OUT_RULES, "count:", len(rules))
@@ -1,9 +1,13 @@
-import json
+import os
+import numpy as np
+import orjson
 import pandas as pd
 from collections import defaultdict
+from utils_io import read_jsonl
 
 COMMENTS_IN = "data/comments.jsonl"
 VIDEOS_META = "data/videos.jsonl"
+USER_ITEMS = "data/user_items.jsonl"
 RULES_CSV = "data/arl_rules_fixed.csv"
 
 OUT_USERS = "data/user_rule_hits.csv"
@@ -11,48 +15,61 @@ OUT_USERS = "data/user_rule_hits.csv"
 TOP_K_RULES = 200
 MIN_LIFT = 1.1
 MIN_CONF = 0.20
+USER_BATCH = 2048  # users per broadcast block when matching rule bitmasks
 
 def load_video_to_channel():
     v2c = {}
-    with open(VIDEOS_META, "r", encoding="utf-8") as f:
+    with open(VIDEOS_META, "rb", buffering=1 << 20) as f:
         for line in f:
-            r = json.loads(line)
+            r = orjson.loads(line)
             vid = r.get("video_id")
             ch  = r.get("channel_id")
             if vid and ch:
                 v2c[vid] = ch
     return v2c
 
-def main():
-    v2c = load_video_to_channel()
+def to_bitmasks(item_sets, bit_of, n_words):
+    """Encode each item set as a row of uint64 words (one bit per rule-vocabulary item)."""
+    rows, bits = [], []
+    vocab = bit_of.keys()
+    for i, items in enumerate(item_sets):
+        # Only rule-vocabulary items get a bit; most users share few or none.
+        for it in items & vocab:
+            rows.append(i)
+            bits.append(bit_of[it])
+    masks = np.zeros((len(item_sets), n_words), dtype=np.uint64)
+    if bits:
+        bits = np.asarray(bits, dtype=np.uint64)
+        words = (bits >> np.uint64(6)).astype(np.intp)
+        np.bitwise_or.at(masks, (np.asarray(rows), words), np.uint64(1) << (bits & np.uint64(63)))
+    return masks
 
+def scan_comments(v2c):
     user_items = defaultdict(set)
-    with open(COMMENTS_IN, "r", encoding="utf-8") as f:
+    with open(COMMENTS_IN, "rb", buffering=1 << 20) as f:
         for line in f:
-            r = json.loads(line)
+            r = orjson.loads(line)
             u = r["author_id"]
             vid = r["video_id"]
+            # Items are already lowercased by 01_ingest_x_csv.py.
             ch = v2c.get(vid)
-            if ch:
-                user_items[u].add(f"CH:{ch}")
-
-            doms = r.get("domains", [])
-            if doms:
-                for d in doms:
-                    if d:
-                        user_items[u].add(f"DOM:{d.lower()}")
+            items = [f"CH:{ch}"] if ch else []
+            items += [f"DOM:{d}" for d in r.get("domains") or () if d]
+            items += [f"TAG:{t}" for t in r.get("hashtags") or () if t]
+            items += [f"MENT:{m}" for m in r.get("mentions") or () if m]
+            if items:
+                user_items[u].update(items)
+    return user_items
 
-            tags = r.get("hashtags", [])
-            if tags:
-                for t in tags:
-                    if t:
-                        user_items[u].add(f"TAG:{t.lower()}")
+def user_items_fresh():
+    return os.path.exists(USER_ITEMS) and os.path.getmtime(USER_ITEMS) >= os.path.getmtime(COMMENTS_IN)
 
-            mentions = r.get("mentions", [])
-            if mentions:
-                for m in mentions:
-                    if m:
-                        user_items[u].add(f"MENT:{m.lower()}")
+def main():
+    if user_items_fresh():
+        # Precomputed by 01_ingest_x_csv.py; avoids re-parsing comments.jsonl.
+        user_items = {r["author_id"]: set(r["items"]) for r in read_jsonl(USER_ITEMS)}
+    else:
+        user_items = scan_comments(load_video_to_channel())
 
     rules = pd.read_csv(RULES_CSV)
     if len(rules) == 0:
@@ -63,20 +80,29 @@ def main():
 
     def to_set(s: str):
         if pd.isna(s) or not str(s).strip():
-            return set()
-        return set(x.strip() for x in str(s).split(",") if x.strip())
+            return frozenset()
+        return frozenset(x.strip() for x in str(s).split(",") if x.strip())
+
+    rule_ants = [ant for ant in (to_set(s) for s in rules["antecedents"].tolist()) if ant]
 
-    rule_ants = [to_set(s) for s in rules["antecedents"].tolist()]
+    # A user hits a rule when (user_bits & rule_bits) == rule_bits on every word.
+    vocab = sorted(frozenset().union(*rule_ants))
+    bit_of = {it: b for b, it in enumerate(vocab)}
+    n_words = max(1, (len(vocab) + 63) // 64)
+    R = to_bitmasks(rule_ants, bit_of, n_words)
 
-    rows = []
-    for u, items in user_items.items():
-        hits = 0
-        for ant in rule_ants:
-            if ant and ant.issubset(items):
-                hits += 1
-        rows.append({"author_id": u, "num_items": len(items), "rule_hits": hits})
+    users = list(user_items)
+    U = to_bitmasks([user_items[u] for u in users], bit_of, n_words)
+    hits = np.zeros(len(users), dtype=np.int64)
+    for start in range(0, len(users), USER_BATCH):
+        block = U[start:start + USER_BATCH, None, :]
+        hits[start:start + USER_BATCH] = ((block & R[None, :, :]) == R[None, :, :]).all(axis=2).sum(axis=1)
 
-    df = pd.DataFrame(rows).sort_values(["rule_hits","num_items"], ascending=[False, False])
+    df = pd.DataFrame({
+        "author_id": users,
+        "num_items": [len(user_items[u]) for u in users],
+        "rule_hits": hits,
+    }).sort_values(["rule_hits","num_items"], ascending=[False, False])
     df.to_csv(OUT_USERS, index=False)
     print("Saved:", OUT_USERS)
     print(df.head(20).to_string(index=False))
@@ -1,84 +1,78 @@
 import csv
-import json
+import multiprocessing as mp
 import os
 import re
 from collections import Counter, defaultdict
 
-import networkx as nx
+import orjson
 
+from utils_io import iter_byte_ranges, read_jsonl
 from utils_text import normalize_text_basic, sensational_score
 
 
 COMMENTS_IN = "data/comments.jsonl"
-GRAPH_UU = "data/graph_user_user.gexf"
+GRAPH_UU_NODES = "data/graph_user_user_nodes.jsonl"
 
 OUT_COMMENTS = "data/comment_nlp_features.jsonl"
 OUT_USERS = "data/user_nlp_features.csv"
 OUT_COMM_TERMS = "data/community_top_terms.csv"
 
 TOP_TERMS_PER_COMM = 20
+NLP_WORKERS = None  # None = os.cpu_count()
+RANGES_PER_WORKER = 4  # byte ranges per worker, for load balancing
 
 WORD_RE = re.compile(r"[A-Za-z']+")
 
-STOPWORDS = {
+STOPWORDS = frozenset({
     "the","and","for","are","but","not","you","your","with","that","this","from","they","their","have","has","had",
     "was","were","will","would","can","could","should","a","an","to","of","in","on","at","by","as","it","its",
     "is","be","we","our","us","or","if","so","do","did","does","what","when","where","who","why","how","rt"
-}
+})
 
-POS_WORDS = {
+POS_WORDS = frozenset({
     "good","great","excellent","amazing","love","like","win","winning","success","best","strong","brave","support",
     "positive","happy","truth","trust","hope","peace","safe","secure","freedom","victory"
-}
+})
 
-NEG_WORDS = {
+NEG_WORDS = frozenset({
     "bad","worst","terrible","hate","fraud","lies","liar","corrupt","weak","crime","crisis","danger","fake","scam",
     "hoax","fear","angry","sad","threat","rigged","disaster","fail","failure","loss"
-}
+})
 
 
-def tokenize(text: str) -> list[str]:
-    tokens = []
+def token_stats(text: str, terms: Counter | None = None) -> tuple[int, int, int, float]:
+    """Single pass over the words of `text`: (token_count, pos, neg, polarity).
+
+    Tokens are words of 3+ letters that are not stopwords; when `terms` is
+    given they are counted into it as well.
+    """
+    count = pos = neg = 0
     for w in WORD_RE.findall(text.lower()):
-        if len(w) < 3:
-            continue
-        if w in STOPWORDS:
+        if len(w) < 3 or w in STOPWORDS:
             continue
-        tokens.append(w)
-    return tokens
-
-
-def polarity_scores(tokens: list[str]) -> tuple[int, int, float]:
-    pos = sum(1 for t in tokens if t in POS_WORDS)
-    neg = sum(1 for t in tokens if t in NEG_WORDS)
-    denom = max(1, len(tokens))
-    polarity = (pos - neg) / denom
-    return pos, neg, polarity
+        count += 1
+        if w in POS_WORDS:
+            pos += 1
+        elif w in NEG_WORDS:
+            neg += 1
+        if terms is not None:
+            terms[w] += 1
+    polarity = (pos - neg) / max(1, count)
+    return count, pos, neg, polarity
 
 
 def load_community_map() -> dict[str, int]:
-    if not os.path.exists(GRAPH_UU):
+    if not os.path.exists(GRAPH_UU_NODES):
         return {}
-    g = nx.read_gexf(GRAPH_UU)
-    comm_map = {}
-    for n, data in g.nodes(data=True):
-        c = data.get("community")
-        if c is not None:
-            try:
-                comm_map[str(n)] = int(c)
-            except ValueError:
-                continue
-    return comm_map
-
+    return {
+        str(r["author_id"]): int(r["community"])
+        for r in read_jsonl(GRAPH_UU_NODES)
+        if r.get("community") is not None
+    }
 
-def main() -> None:
-    if not os.path.exists(COMMENTS_IN):
-        raise FileNotFoundError(f"Missing input file: {COMMENTS_IN}")
-
-    comm_map = load_community_map()
-    comm_terms: dict[int, Counter] = defaultdict(Counter)
 
-    user_stats = defaultdict(lambda: {
+def new_user_stats() -> dict:
+    return {
         "comments": 0,
         "tokens": 0,
         "pos": 0,
@@ -88,56 +82,133 @@ def main() -> None:
         "hashtags": 0,
         "mentions": 0,
         "urls": 0,
-    })
-
-    with open(COMMENTS_IN, "r", encoding="utf-8") as fin, \
-            open(OUT_COMMENTS, "w", encoding="utf-8") as fout:
-        for line in fin:
-            r = json.loads(line)
-            text = normalize_text_basic(r.get("text", "") or "")
-            tokens = tokenize(text)
-            pos, neg, pol = polarity_scores(tokens)
-            sens = sensational_score(text)
-
-            hashtags = r.get("hashtags", []) or []
-            mentions = r.get("mentions", []) or []
-            urls = r.get("urls", []) or []
-
-            out = {
-                "comment_id": r.get("comment_id"),
-                "author_id": r.get("author_id"),
-                "video_id": r.get("video_id"),
-                "published_at": r.get("published_at"),
-                "lang": r.get("lang") or "",
-                "char_count": len(text),
-                "token_count": len(tokens),
-                "pos_count": pos,
-                "neg_count": neg,
-                "polarity": pol,
-                "sensational_score": sens,
-                "num_hashtags": len(hashtags),
-                "num_mentions": len(mentions),
-                "num_urls": len(urls),
-            }
-            fout.write(json.dumps(out, ensure_ascii=False) + "\n")
-
-            u = r.get("author_id")
-            if u:
-                st = user_stats[u]
-                st["comments"] += 1
-                st["tokens"] += len(tokens)
-                st["pos"] += pos
-                st["neg"] += neg
-                st["polarity_sum"] += pol
-                st["sens_sum"] += sens
-                st["hashtags"] += len(hashtags)
-                st["mentions"] += len(mentions)
-                st["urls"] += len(urls)
-
-            if comm_map:
-                comm_id = comm_map.get(str(r.get("author_id")))
-                if comm_id is not None:
-                    comm_terms[comm_id].update(tokens)
+    }
+
+
+# Float features travel from the workers as per-comment values in row order and are summed
+# in the parent, so the sums do not depend on where the byte ranges split.
+FLOAT_SUMS = {"polarity_vals": "polarity_sum", "sens_vals": "sens_sum"}
+
+
+def new_partial_stats() -> dict:
+    """Worker-side user stats: integer counts plus per-comment float values (FLOAT_SUMS)."""
+    st = {k: v for k, v in new_user_stats().items() if k not in FLOAT_SUMS.values()}
+    st.update({k: [] for k in FLOAT_SUMS})
+    return st
+
+
+_comm_map: dict[str, int] = {}
+
+
+def init_worker(comm_map: dict[str, int]) -> None:
+    global _comm_map
+    _comm_map = comm_map
+
+
+def process_range(byte_range: tuple[int, int]) -> tuple[bytes, dict, dict]:
+    """Features for one byte range: (jsonl bytes, per-user partial stats, per-community term counts).
+
+    Partial stats carry integer counts plus the per-comment polarity / sensational values
+    (see FLOAT_SUMS) instead of float sums.
+    """
+    start, end = byte_range
+    with open(COMMENTS_IN, "rb") as fin:
+        fin.seek(start)
+        data = fin.read(end - start)
+
+    out_rows = []
+    user_stats: dict[str, dict] = {}
+    comm_terms: dict[int, Counter] = defaultdict(Counter)
+    for line in data.splitlines():
+        if not line.strip():
+            continue
+        r = orjson.loads(line)
+        text = normalize_text_basic(r.get("text", "") or "")
+        comm_id = _comm_map.get(str(r.get("author_id"))) if _comm_map else None
+        terms = comm_terms[comm_id] if comm_id is not None else None
+        n_tokens, pos, neg, pol = token_stats(text, terms)
+        sens = sensational_score(text)
+
+        hashtags = r.get("hashtags", []) or []
+        mentions = r.get("mentions", []) or []
+        urls = r.get("urls", []) or []
+
+        out = {
+            "comment_id": r.get("comment_id"),
+            "author_id": r.get("author_id"),
+            "video_id": r.get("video_id"),
+            "published_at": r.get("published_at"),
+            "lang": r.get("lang") or "",
+            "char_count": len(text),
+            "token_count": n_tokens,
+            "pos_count": pos,
+            "neg_count": neg,
+            "polarity": pol,
+            "sensational_score": sens,
+            "num_hashtags": len(hashtags),
+            "num_mentions": len(mentions),
+            "num_urls": len(urls),
+        }
+        out_rows.append(orjson.dumps(out, option=orjson.OPT_APPEND_NEWLINE))
+
+        u = r.get("author_id")
+        if u:
+            st = user_stats.get(u)
+            if st is None:
+                st = user_stats[u] = new_partial_stats()
+            st["comments"] += 1
+            st["tokens"] += n_tokens
+            st["pos"] += pos
+            st["neg"] += neg
+            st["polarity_vals"].append(pol)
+            st["sens_vals"].append(sens)
+            st["hashtags"] += len(hashtags)
+            st["mentions"] += len(mentions)
+            st["urls"] += len(urls)
+
+    return b"".join(out_rows), user_stats, comm_terms
+
+
+def main() -> None:
+    if not os.path.exists(COMMENTS_IN):
+        raise FileNotFoundError(f"Missing input file: {COMMENTS_IN}")
+
+    comm_map = load_community_map()
+    comm_terms: dict[int, Counter] = defaultdict(Counter)
+    user_stats: dict[str, dict] = {}
+
+    workers = NLP_WORKERS or os.cpu_count() or 1
+    ranges = list(iter_byte_ranges(COMMENTS_IN, workers * RANGES_PER_WORKER))
+
+    pool = None
+    if workers > 1:
+        pool = mp.Pool(workers, initializer=init_worker, initargs=(comm_map,))
+        # imap (not imap_unordered) keeps output rows, user order and term tie-breaks
+        # identical to a sequential pass.
+        results = pool.imap(process_range, ranges)
+    else:
+        init_worker(comm_map)
+        results = map(process_range, ranges)
+
+    with open(OUT_COMMENTS, "wb", buffering=1 << 20) as fout:
+        for rows, part_users, part_terms in results:
+            fout.write(rows)
+            for u, st in part_users.items():
+                acc = user_stats.get(u)
+                if acc is None:
+                    acc = user_stats[u] = new_user_stats()
+                for k, v in st.items():
+                    if k in FLOAT_SUMS:
+                        # same left-to-right additions as a sequential pass
+                        for x in v:
+                            acc[FLOAT_SUMS[k]] += x
+                    else:
+                        acc[k] += v
+            for comm_id, counter in part_terms.items():
+                comm_terms[comm_id].update(counter)
+    if pool is not None:
+        pool.close()
+        pool.join()
 
     with open(OUT_USERS, "w", encoding="utf-8", newline="") as fcsv:
         writer = csv.writer(fcsv)
@@ -1,14 +1,29 @@
 import csv
 import glob
 import json
+import mmap
+import multiprocessing as mp
 import os
+import pickle
 import shutil
 import sqlite3
 import heapq
-from collections import Counter, defaultdict
-from datetime import datetime, timezone
+import struct
+import time
+from collections import Counter, OrderedDict, defaultdict
+from datetime import datetime, timedelta
+from functools import lru_cache
+from itertools import groupby, repeat
+from operator import itemgetter
+from typing import BinaryIO, NamedTuple
+from xml.sax.saxutils import escape
 
-import networkx as nx
+import igraph as ig
+import numpy as np
+import orjson
+import pandas as pd
+
+from utils_io import iter_byte_ranges
 
 
 COMMENTS_IN = "data/comments.jsonl"
@@ -28,16 +43,48 @@ MAX_USERS_PER_ITEM = 200
 MAX_EDGES_FOR_GRAPH = 2_000_000
 MAX_BIP_EDGES = 3_000_000
 CLEANUP_TMP = False
+PARSE_RANGE_BYTES = 64 << 20  # max comments.jsonl bytes per pass-1 task (one pickle frame each)
+RANGES_PER_WORKER = 4  # pass-1 byte ranges per worker, for load balancing
+MAX_OPEN_BUCKETS = 64  # bucket files kept open at once by BucketWriters
+COORD_WORKERS = None  # workers for pass-1 parsing and pass-3a buckets; None = os.cpu_count()
+GEXF_CREATOR = "07_detect_coordination.py"
+
+# Scratch database: rebuilt on every run, so durability is traded for bulk-load speed.
+# pair_signal is loaded in a single transaction.
+SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=OFF",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-262144",
+    "PRAGMA locking_mode=EXCLUSIVE",
+    "PRAGMA mmap_size=30000000000",
+)
+
+
+# Signal ids follow name order, so integer order in SQLite matches the old string order.
+SIGNALS = ("A_DOM", "A_URL", "B_TAG", "C_MENT", "D_QUOTE", "D_RETWEET", "E_CONV", "E_REPLY")
+SIGNAL_ID = {s: i for i, s in enumerate(SIGNALS)}
+BUCKET_ROW = np.dtype("<i4")  # bucket files hold (signal id, item id, user id) int32 triples
+
+
+EPOCH = datetime(1970, 1, 1)
+ONE_SECOND = timedelta(seconds=1)
 
 
+@lru_cache(maxsize=1 << 20)
 def parse_ts(ts: str) -> int | None:
+    """Epoch seconds of an ISO timestamp's wall-clock time, read as UTC.
+
+    Cached: published_at has one-second resolution and repeats across tweets.
+    Naive datetime arithmetic skips the tz-aware timestamp() round-trip.
+    """
     if not ts:
         return None
     try:
         dt = datetime.fromisoformat(ts.replace("Z", "+00:00"))
-        return int(dt.replace(tzinfo=timezone.utc).timestamp())
     except ValueError:
         return None
+    return (dt.replace(tzinfo=None) - EPOCH) // ONE_SECOND
 
 
 def add_items(items: list[tuple[str, str]], signal: str, values: list[str]) -> None:
@@ -71,6 +118,187 @@ def extract_items(r: dict) -> list[tuple[str, str]]:
     return items
 
 
+def scan_range(byte_range: tuple[int, int]) -> tuple[Counter, set[str], list[tuple[int, str, list[tuple[str, str]]]]]:
+    """Item counts, users and (ts, user, items) records for one byte range of comments.jsonl (runs in a worker)."""
+    start, end = byte_range
+    with open(COMMENTS_IN, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        data = mm[start:end]
+
+    counts: Counter = Counter()
+    users = set()
+    records = []
+    for line in data.splitlines():
+        if not line:
+            continue
+        r = orjson.loads(line)
+        ts = parse_ts(r.get("published_at"))
+        if ts is None:
+            continue
+        items = extract_items(r)
+        counts.update(items)
+        user = r.get("author_id")
+        if user and items:
+            records.append((ts, user, items))
+            users.add(user)
+    return counts, users, records
+
+
+def iter_records(path: str):
+    """Yield the (ts, user, items) records spilled by pass 1."""
+    with open(path, "rb", buffering=1 << 20) as f:
+        while True:
+            try:
+                records = pickle.load(f)
+            except EOFError:
+                return
+            yield from records
+
+
+class BucketWriters:
+    """Append packed rows to bucket_<id>.bin files through an LRU cache of open handles."""
+
+    def __init__(self, tmp_dir: str, max_open: int = MAX_OPEN_BUCKETS) -> None:
+        self.tmp_dir = tmp_dir
+        self.max_open = max_open
+        self.files: OrderedDict[int, BinaryIO] = OrderedDict()
+
+    def write(self, bucket: int, data: bytes) -> None:
+        fb = self.files.get(bucket)
+        if fb is None:
+            if len(self.files) >= self.max_open:
+                _, oldest = self.files.popitem(last=False)
+                oldest.close()
+            path = os.path.join(self.tmp_dir, f"bucket_{bucket}.bin")
+            fb = self.files[bucket] = open(path, "ab", buffering=1 << 20)
+        else:
+            self.files.move_to_end(bucket)
+        fb.write(data)
+
+    def close(self) -> None:
+        for fb in self.files.values():
+            fb.close()
+        self.files.clear()
+
+
+class Bucket(NamedTuple):
+    """Column-store view of one bucket file, grouped by item.
+
+    Items are numbered in first-seen order; item k owns
+    ``user_ids[starts[k]:starts[k] + counts[k]]`` (distinct, ascending) and
+    local user id r is global user id ``users[r]``.
+    """
+
+    item_signals: np.ndarray
+    item_ids: np.ndarray
+    starts: np.ndarray
+    counts: np.ndarray
+    user_ids: np.ndarray
+    users: np.ndarray
+
+
+def read_bucket(path: str) -> Bucket:
+    rows = np.fromfile(path, dtype=BUCKET_ROW).reshape(-1, 3)
+    if len(rows) == 0:
+        empty = np.zeros(0, dtype=np.int64)
+        return Bucket(empty, empty, empty, empty, empty, empty)
+    item_codes, item_ids = pd.factorize(rows[:, 1])
+    user_codes, users = pd.factorize(rows[:, 2], sort=True)
+
+    # One sort over (item, user) keys dedupes users per item and groups items contiguously.
+    n_users = len(users)
+    pairs = np.unique(item_codes.astype(np.int64) * n_users + user_codes)
+    items, user_ids = np.divmod(pairs, n_users)
+    starts = np.searchsorted(items, np.arange(len(item_ids)))
+    counts = np.diff(np.append(starts, len(items)))
+
+    # An item id always carries the same signal, so any of its rows gives it.
+    item_signals = np.empty(len(item_ids), dtype=rows.dtype)
+    item_signals[item_codes] = rows[:, 0]
+    return Bucket(item_signals, item_ids, starts, counts, user_ids, users)
+
+
+@lru_cache(maxsize=None)
+def triu_pairs(n: int) -> tuple[np.ndarray, np.ndarray]:
+    """Index arrays (i, j) of all i < j pairs among n sorted users."""
+    return np.triu_indices(n, k=1)
+
+
+def process_bucket(path: str) -> tuple[int | None, list[tuple[int, np.ndarray, np.ndarray, np.ndarray]], dict]:
+    """Per-signal pair counts over global user ids plus time-window stats for one bucket file (runs in a worker)."""
+    bucket = read_bucket(path)
+    n_users = len(bucket.users)
+
+    # Top item: first-seen among those with the most distinct users (resolved to a name by main).
+    top_item = None
+    top_signal = None
+    if len(bucket.counts):
+        k = int(np.argmax(bucket.counts))
+        top_signal = SIGNALS[int(bucket.item_signals[k])]
+        top_item = int(bucket.item_ids[k])
+
+    # Global user ids rank users in sorted name order and local codes keep that order,
+    # so a < b matches the (user_a < user_b) string order; each pair is encoded as a
+    # single int64 key a * n_users + b over local codes.
+    pairable = np.flatnonzero((bucket.counts >= 2) & (bucket.counts <= MAX_USERS_PER_ITEM))
+    signal_keys: dict[int, list[np.ndarray]] = defaultdict(list)
+    for sig, start, n in zip(
+        bucket.item_signals[pairable].tolist(), bucket.starts[pairable].tolist(), bucket.counts[pairable].tolist()
+    ):
+        ids = bucket.user_ids[start:start + n]
+        i, j = triu_pairs(n)
+        signal_keys[sig].append(ids[i] * n_users + ids[j])
+
+    pair_counts = []
+    for sig, keys in signal_keys.items():
+        keys, counts = np.unique(np.concatenate(keys), return_counts=True)
+        a_ids, b_ids = np.divmod(keys, n_users)
+        pair_counts.append((sig, bucket.users[a_ids], bucket.users[b_ids], counts))
+
+    bucket_name = os.path.basename(path)
+    try:
+        bucket_id = int(bucket_name.split("_")[1].split(".")[0])
+    except (IndexError, ValueError):
+        bucket_id = None
+    n = bucket.counts[pairable]
+    stats = {
+        "active_users": n_users,
+        "num_coord_edges_created": int((n * (n - 1) // 2).sum()),
+        "top_signal": top_signal or "",
+        "top_item": top_item,
+    }
+    return bucket_id, pair_counts, stats
+
+
+def iter_pair_rows(pair_counts: list[tuple[int, np.ndarray, np.ndarray, np.ndarray]]):
+    """(user_a, user_b, signal, cnt) id rows, decoded lazily for executemany."""
+    for sig, a_ids, b_ids, counts in pair_counts:
+        yield from zip(a_ids.tolist(), b_ids.tolist(), repeat(sig), counts.tolist())
+
+
+def iter_coord_pairs(cur: sqlite3.Cursor):
+    """(user_a, user_b, {signal: cnt}, total) per pair of user ids, in (user_a, user_b) order.
+
+    With SQLite's JSON functions the grouping and the MIN_OCC prefilter run in SQL,
+    so only pairs with at least two qualifying signals reach Python; otherwise the
+    signal rows are grouped here.
+    """
+    if sqlite3.sqlite_version_info >= (3, 38, 0):
+        cur.execute(
+            "SELECT user_a, user_b, json_group_object(signal, cnt), SUM(cnt) FROM pair_signal "
+            "GROUP BY user_a, user_b HAVING SUM(cnt >= ?) >= 2 ORDER BY user_a, user_b",
+            (MIN_OCC,),
+        )
+        for user_a, user_b, sigs_json, total_occ in cur:
+            sig_counts = {SIGNALS[int(sig)]: cnt for sig, cnt in orjson.loads(sigs_json).items()}
+            yield user_a, user_b, sig_counts, total_occ
+        return
+
+    cur.execute("SELECT user_a, user_b, signal, cnt FROM pair_signal ORDER BY user_a, user_b, signal")
+    for (user_a, user_b), rows in groupby(cur, key=lambda r: (r[0], r[1])):
+        sig_counts = {SIGNALS[sig]: cnt for _a, _b, sig, cnt in rows}
+        yield user_a, user_b, sig_counts, sum(sig_counts.values())
+
+
 def to_bip_item(signal: str, value: str) -> str | None:
     if not value:
         return None
@@ -87,365 +315,351 @@ def to_bip_item(signal: str, value: str) -> str | None:
     return None
 
 
+def iso_utc(ts: int) -> str:
+    """Epoch seconds as the isoformat() of the UTC datetime (e.g. 2024-10-20T00:00:00+00:00)."""
+    return time.strftime("%Y-%m-%dT%H:%M:%S+00:00", time.gmtime(ts))
+
+
+# Same escaping as ElementTree attributes, so output matches nx.write_gexf.
+GEXF_ATTR_ENTITIES = {'"': "&quot;", "\r": "&#13;", "\n": "&#10;", "\t": "&#09;"}
+
+
+def write_gexf(
+    path: str,
+    nodes: list[str],
+    edges: list[tuple[int, int]],
+    weights: list[int],
+    node_attr: tuple[str, list[str]] | None = None,
+    edge_attr: tuple[str, list[str]] | None = None,
+) -> None:
+    """Stream an undirected GEXF 1.2 graph over node indices, laid out as nx.write_gexf does.
+
+    Edges come out the way networkx iterates a Graph: grouped by the endpoint seen
+    first, in insertion order, with that endpoint as the source.
+    """
+    def attr(value) -> str:
+        return escape(str(value), GEXF_ATTR_ENTITIES)
+
+    names = [attr(name) for name in nodes]
+    node_attr_id = "0"
+    edge_attr_id = "1" if node_attr else "0"
+    with open(path, "w", encoding="utf-8", newline="\n", buffering=1 << 20) as f:
+        f.write(
+            "<?xml version='1.0' encoding='utf-8'?>\n"
+            '<gexf xmlns="http://www.gexf.net/1.2draft" xmlns:xsi="http://www.w3.org/2001/XMLSchema-instance" '
+            'xsi:schemaLocation="http://www.gexf.net/1.2draft http://www.gexf.net/1.2draft/gexf.xsd" version="1.2">\n'
+            f'  <meta lastmodifieddate="{time.strftime("%Y-%m-%d")}">\n'
+            f"    <creator>{escape(GEXF_CREATOR)}</creator>\n"
+            "  </meta>\n"
+            '  <graph defaultedgetype="undirected" mode="static" name="">\n'
+        )
+        for cls, spec, attr_id in (("edge", edge_attr, edge_attr_id), ("node", node_attr, node_attr_id)):
+            if spec:
+                f.write(
+                    f'    <attributes mode="static" class="{cls}">\n'
+                    f'      <attribute id="{attr_id}" title="{attr(spec[0])}" type="string" />\n'
+                    "    </attributes>\n"
+                )
+
+        f.write("    <nodes>\n" if names else "    <nodes />\n")
+        if node_attr:
+            f.writelines(
+                f'      <node id="{name}" label="{name}">\n'
+                f"        <attvalues>\n"
+                f'          <attvalue for="{node_attr_id}" value="{attr(value)}" />\n'
+                f"        </attvalues>\n"
+                f"      </node>\n"
+                for name, value in zip(names, node_attr[1])
+            )
+        else:
+            f.writelines(f'      <node id="{name}" label="{name}" />\n' for name in names)
+        if names:
+            f.write("    </nodes>\n")
+
+        ends = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+        lo, hi = ends.min(axis=1), ends.max(axis=1)
+        order = np.lexsort((np.arange(len(ends)), lo))
+        f.write("    <edges>\n" if len(order) else "    <edges />\n")
+        for edge_id, e in enumerate(order.tolist()):
+            head = f'      <edge source="{names[lo[e]]}" target="{names[hi[e]]}" id="{edge_id}" weight="{weights[e]}"'
+            if edge_attr:
+                f.write(
+                    f"{head}>\n"
+                    f"        <attvalues>\n"
+                    f'          <attvalue for="{edge_attr_id}" value="{attr(edge_attr[1][e])}" />\n'
+                    f"        </attvalues>\n"
+                    f"      </edge>\n"
+                )
+            else:
+                f.write(f"{head} />\n")
+        if len(order):
+            f.write("    </edges>\n")
+        f.write("  </graph>\n</gexf>\n")
+
+
 def main() -> None:
     if not os.path.exists(COMMENTS_IN):
         raise FileNotFoundError(f"Missing input file: {COMMENTS_IN}")
 
-    item_counts: Counter = Counter()
-
-    # Pass 1: count items globally (for frequency filter).
-    with open(COMMENTS_IN, "r", encoding="utf-8") as f:
-        for line in f:
-            r = json.loads(line)
-            ts = parse_ts(r.get("published_at"))
-            if ts is None:
-                continue
-            for key in extract_items(r):
-                item_counts[key] += 1
-
-    kept_items = {k for k, c in item_counts.items() if c >= MIN_ITEM_FREQ}
-    print("Total items:", len(item_counts), "Kept items:", len(kept_items))
-
-    # Pass 2: bucketize kept items to disk to reduce RAM usage.
     if os.path.exists(TMP_DIR):
         shutil.rmtree(TMP_DIR)
     os.makedirs(TMP_DIR, exist_ok=True)
 
-    with open(COMMENTS_IN, "r", encoding="utf-8") as f:
-        for line in f:
-            r = json.loads(line)
-            ts = parse_ts(r.get("published_at"))
-            if ts is None:
-                continue
-            user = r.get("author_id")
-            if not user:
-                continue
-            bucket = ts // WINDOW_SECS
-            items = extract_items(r)
-            if not items:
-                continue
-            path = os.path.join(TMP_DIR, f"bucket_{bucket}.tsv")
-            with open(path, "a", encoding="utf-8") as fb:
-                for signal, value in items:
-                    key = (signal, value)
-                    if key in kept_items:
-                        fb.write(f"{signal}\t{value}\t{user}\n")
+    item_counts: Counter = Counter()
+    user_set: set[str] = set()
+
+    workers = COORD_WORKERS or os.cpu_count() or 1
+    pool = mp.Pool(workers) if workers > 1 else None
+
+    # Pass 1: the only parse of comments.jsonl, over byte ranges. Count items globally
+    # (for the frequency filter) and spill (ts, user, items) records for the later
+    # passes; imap keeps range order, so records are spilled in file order.
+    size = os.path.getsize(COMMENTS_IN)
+    n_ranges = max(workers * RANGES_PER_WORKER, -(-size // PARSE_RANGE_BYTES))
+    ranges = list(iter_byte_ranges(COMMENTS_IN, n_ranges))
+    results = pool.imap(scan_range, ranges) if pool else map(scan_range, ranges)
+    records_path = os.path.join(TMP_DIR, "records.pkl")
+    with open(records_path, "wb", buffering=1 << 20) as frec:
+        for counts, users, records in results:
+            item_counts.update(counts)
+            user_set |= users
+            if records:
+                pickle.dump(records, frec, protocol=pickle.HIGHEST_PROTOCOL)
+
+    # Dictionary-encode users and kept items as int32 ids; names are only resolved
+    # when writing outputs. User ids follow sorted name order.
+    user_names = sorted(user_set)
+    user_id = {u: i for i, u in enumerate(user_names)}
+    del user_set
+    item_id: dict[tuple[str, str], int] = {}
+    for item, c in item_counts.items():
+        if c >= MIN_ITEM_FREQ:
+            item_id[item] = len(item_id)
+    item_keys = list(item_id)
+    item_sig = [SIGNAL_ID[signal] for signal, _value in item_keys]
+    bip_names = [to_bip_item(signal, value) for signal, value in item_keys]
+    print("Total items:", len(item_counts), "Kept items:", len(item_id))
 
     db_path = os.path.join(TMP_DIR, "coordination.db")
     if os.path.exists(db_path):
         os.remove(db_path)
-    conn = sqlite3.connect(db_path)
+    # Autocommit mode: the pair_signal load runs in one explicit BEGIN ... COMMIT.
+    conn = sqlite3.connect(db_path, isolation_level=None)
     cur = conn.cursor()
+    for pragma in SQLITE_PRAGMAS:
+        cur.execute(pragma)
+    # Unindexed staging table takes plain INSERTs; it is aggregated with one
+    # GROUP BY into pair_signal once loaded.
     cur.execute("""
-        CREATE TABLE pair_signal (
-            user_a TEXT NOT NULL,
-            user_b TEXT NOT NULL,
-            signal TEXT NOT NULL,
-            cnt INTEGER NOT NULL,
-            PRIMARY KEY (user_a, user_b, signal)
-        )
-    """)
-    cur.execute("""
-        CREATE TABLE user_item (
-            user_id TEXT NOT NULL,
-            item_id TEXT NOT NULL,
-            cnt INTEGER NOT NULL,
-            PRIMARY KEY (user_id, item_id)
+        CREATE TABLE pair_signal_stage (
+            user_a INTEGER NOT NULL,
+            user_b INTEGER NOT NULL,
+            signal INTEGER NOT NULL,
+            cnt INTEGER NOT NULL
         )
     """)
-    conn.commit()
 
-    # Pass 3a: per-bucket aggregation to pairs (persisted to SQLite).
+    # Pass 2: bucketize kept items to disk to reduce RAM usage, and count
+    # user-item bipartite edges in memory from the same records, keyed on the
+    # packed (user id << 32) | item id.
+    ui_counts: Counter[int] = Counter()
+    writers = BucketWriters(TMP_DIR)
+    item_id_get = item_id.get
+    for ts, user, items in iter_records(records_path):
+        uid = user_id[user]
+        kept = [i for i in map(item_id_get, items) if i is not None]
+        # Every record with items touches its bucket file, even if none are kept.
+        rows = [x for i in kept for x in (item_sig[i], i, uid)]
+        writers.write(ts // WINDOW_SECS, struct.pack(f"<{len(rows)}i", *rows))
+
+        for i in kept:
+            if bip_names[i]:
+                ui_counts[(uid << 32) | i] += 1
+    writers.close()
+
+    # Pass 3a: per-bucket aggregation to pairs (persisted to SQLite). Buckets are
+    # independent, so workers compute them and the main process is the only DB writer.
     bucket_stats = {}
-    for path in glob.glob(os.path.join(TMP_DIR, "bucket_*.tsv")):
-        item_users: dict[tuple[str, str], set[str]] = defaultdict(set)
-        bucket_users: set[str] = set()
-        with open(path, "r", encoding="utf-8") as fb:
-            for line in fb:
-                signal, value, user = line.strip().split("\t")
-                item_users[(signal, value)].add(user)
-                bucket_users.add(user)
-
-        bucket_counts: dict[tuple[str, str, str], int] = defaultdict(int)
-        top_item = None
-        top_item_users = 0
-        top_signal = None
-        top_signal_users = 0
-        for (signal, value), users in item_users.items():
-            ucount = len(users)
-            if ucount > top_item_users:
-                top_item_users = ucount
-                top_item = f"{signal}:{value}"
-            if ucount > top_signal_users:
-                top_signal_users = ucount
-                top_signal = signal
-        for (signal, _value), users in item_users.items():
-            if len(users) < 2:
-                continue
-            if len(users) > MAX_USERS_PER_ITEM:
-                continue
-            users = sorted(users)
-            n = len(users)
-            for i in range(n):
-                for j in range(i + 1, n):
-                    a, b = users[i], users[j]
-                    bucket_counts[(a, b, signal)] += 1
-
-        if bucket_counts:
-            cur.executemany(
-                "INSERT INTO pair_signal(user_a, user_b, signal, cnt) VALUES (?,?,?,?) "
-                "ON CONFLICT(user_a, user_b, signal) DO UPDATE SET cnt = cnt + excluded.cnt",
-                [(a, b, s, c) for (a, b, s), c in bucket_counts.items()],
-            )
-            conn.commit()
+    paths = glob.glob(os.path.join(TMP_DIR, "bucket_*.bin"))
+    results = pool.imap_unordered(process_bucket, paths, chunksize=4) if pool else map(process_bucket, paths)
 
-        bucket_name = os.path.basename(path)
-        try:
-            bucket_id = int(bucket_name.split("_")[1].split(".")[0])
-        except (IndexError, ValueError):
-            bucket_id = None
-        if bucket_id is not None:
-            num_edges_created = 0
-            for (signal, _value), users in item_users.items():
-                if len(users) >= 2 and len(users) <= MAX_USERS_PER_ITEM:
-                    n = len(users)
-                    num_edges_created += (n * (n - 1)) // 2
-            bucket_stats[bucket_id] = {
-                "active_users": len(bucket_users),
-                "num_coord_edges_created": num_edges_created,
-                "top_signal": top_signal or "",
-                "top_item": top_item or "",
-            }
-
-    # Pass 3b: user-item bipartite counts (streamed from comments).
-    batch = []
-    batch_size = 5000
-    with open(COMMENTS_IN, "r", encoding="utf-8") as f:
-        for line in f:
-            r = json.loads(line)
-            ts = parse_ts(r.get("published_at"))
-            if ts is None:
-                continue
-            user = r.get("author_id")
-            if not user:
-                continue
-            for signal, value in extract_items(r):
-                key = (signal, value)
-                if key not in kept_items:
-                    continue
-                item_id = to_bip_item(signal, value)
-                if not item_id:
-                    continue
-                batch.append((user, item_id, 1))
-                if len(batch) >= batch_size:
-                    cur.executemany(
-                        "INSERT INTO user_item(user_id, item_id, cnt) VALUES (?,?,?) "
-                        "ON CONFLICT(user_id, item_id) DO UPDATE SET cnt = cnt + excluded.cnt",
-                        batch,
-                    )
-                    conn.commit()
-                    batch.clear()
-    if batch:
+    cur.execute("BEGIN")
+    for bucket_id, pair_counts, stats in results:
         cur.executemany(
-            "INSERT INTO user_item(user_id, item_id, cnt) VALUES (?,?,?) "
-            "ON CONFLICT(user_id, item_id) DO UPDATE SET cnt = cnt + excluded.cnt",
-            batch,
+            "INSERT INTO pair_signal_stage(user_a, user_b, signal, cnt) VALUES (?,?,?,?)",
+            iter_pair_rows(pair_counts),
         )
-        conn.commit()
+        if bucket_id is not None:
+            top_item = stats["top_item"]
+            stats["top_item"] = "" if top_item is None else ":".join(item_keys[top_item])
+            bucket_stats[bucket_id] = stats
+    if pool is not None:
+        pool.close()
+        pool.join()
 
-    # Pass 4: stream pairs from SQLite and write outputs.
-    G = nx.Graph()
+    cur.execute("""
+        CREATE TABLE pair_signal AS
+        SELECT user_a, user_b, signal, SUM(cnt) AS cnt FROM pair_signal_stage
+        GROUP BY user_a, user_b, signal
+    """)
+    cur.execute("CREATE INDEX idx_pair ON pair_signal(user_a, user_b, signal)")
+    cur.execute("DROP TABLE pair_signal_stage")
+    cur.execute("COMMIT")
+
+    # Pass 4: stream pairs from SQLite and write outputs. The coordination graph is
+    # kept as edge lists over contiguous node ids (first-seen order) for igraph.
+    node_idx: dict[int, int] = {}
+    edge_list: list[tuple[int, int]] = []
+    edge_weights: list[int] = []
+    edge_signals: list[str] = []
     edges_written = 0
 
     top_edges = []
     edge_seq = 0
 
     with open(OUT_EDGES, "w", encoding="utf-8", newline="") as fcsv:
-        writer = csv.DictWriter(fcsv, fieldnames=[
-            "user_a", "user_b", "num_signals", "total_occurrences", "signals", "signal_counts"
-        ])
-        writer.writeheader()
-
-        cur.execute("SELECT user_a, user_b, signal, cnt FROM pair_signal ORDER BY user_a, user_b")
-        current = None
-        sig_counts: dict[str, int] = {}
-        total_occ = 0
-
-        for user_a, user_b, signal, cnt in cur:
-            key = (user_a, user_b)
-            if current is None:
-                current = key
-            if key != current:
-                signals_met = [s for s, c in sig_counts.items() if c >= MIN_OCC]
-                if len(signals_met) >= 2:
-                    row = {
-                        "user_a": current[0],
-                        "user_b": current[1],
-                        "num_signals": len(signals_met),
-                        "total_occurrences": total_occ,
-                        "signals": ",".join(sorted(signals_met)),
-                        "signal_counts": json.dumps(sig_counts, ensure_ascii=False),
-                    }
-                    writer.writerow(row)
-                    edges_written += 1
-                    score = int(total_occ)
-                    edge_seq += 1
-                    entry = (score, edge_seq, row)
-                    if len(top_edges) < 50:
-                        heapq.heappush(top_edges, entry)
-                    else:
-                        heapq.heappushpop(top_edges, entry)
-                    if edges_written <= MAX_EDGES_FOR_GRAPH:
-                        G.add_edge(current[0], current[1], weight=int(total_occ), signals=",".join(sorted(signals_met)))
-
-                current = key
-                sig_counts = {}
-                total_occ = 0
-
-            sig_counts[signal] = sig_counts.get(signal, 0) + cnt
-            total_occ += cnt
-
-        if current is not None:
+        writer = csv.writer(fcsv)
+        writer.writerow(["user_a", "user_b", "num_signals", "total_occurrences", "signals", "signal_counts"])
+
+        for user_a, user_b, sig_counts, total_occ in iter_coord_pairs(cur):
             signals_met = [s for s, c in sig_counts.items() if c >= MIN_OCC]
-            if len(signals_met) >= 2:
-                row = {
-                    "user_a": current[0],
-                    "user_b": current[1],
-                    "num_signals": len(signals_met),
-                    "total_occurrences": total_occ,
-                    "signals": ",".join(sorted(signals_met)),
-                    "signal_counts": json.dumps(sig_counts, ensure_ascii=False),
-                }
-                writer.writerow(row)
-                edges_written += 1
-                score = int(total_occ)
-                edge_seq += 1
-                entry = (score, edge_seq, row)
-                if len(top_edges) < 50:
-                    heapq.heappush(top_edges, entry)
-                else:
-                    heapq.heappushpop(top_edges, entry)
-                if edges_written <= MAX_EDGES_FOR_GRAPH:
-                    G.add_edge(current[0], current[1], weight=int(total_occ), signals=",".join(sorted(signals_met)))
+            if len(signals_met) < 2:
+                continue
+            signals = ",".join(sorted(signals_met))
+            row = (
+                user_names[user_a], user_names[user_b], len(signals_met), total_occ,
+                signals, json.dumps(sig_counts, ensure_ascii=False),
+            )
+            writer.writerow(row)
+            edges_written += 1
+            score = int(total_occ)
+            edge_seq += 1
+            entry = (score, edge_seq, row)
+            if len(top_edges) < 50:
+                heapq.heappush(top_edges, entry)
+            else:
+                heapq.heappushpop(top_edges, entry)
+            if edges_written <= MAX_EDGES_FOR_GRAPH:
+                edge_list.append((node_idx.setdefault(user_a, len(node_idx)), node_idx.setdefault(user_b, len(node_idx))))
+                edge_weights.append(int(total_occ))
+                edge_signals.append(signals)
+
+    nodes = [user_names[u] for u in node_idx]
+    g = ig.Graph(n=len(nodes), edges=edge_list, edge_attrs={"weight": edge_weights, "signals": edge_signals})
+    comps = g.connected_components() if nodes else []
 
     clusters = []
-    if G.number_of_nodes() > 0 and edges_written <= MAX_EDGES_FOR_GRAPH:
-        for idx, comp in enumerate(nx.connected_components(G)):
-            comp = list(comp)
-            sig_counter = Counter()
-            for u in comp:
-                for v in G.neighbors(u):
-                    sigs = G.edges[u, v].get("signals", "")
-                    for s in sigs.split(","):
-                        if s:
-                            sig_counter[s] += 1
-            clusters.append({
-                "cluster_id": idx,
-                "size": len(comp),
-                "users_sample": ",".join(comp[:20]),
-                "top_signals": ",".join([f"{s}:{c}" for s, c in sig_counter.most_common(5)]),
-            })
-
-        clusters = sorted(clusters, key=lambda r: r["size"], reverse=True)
+    if nodes and edges_written <= MAX_EDGES_FOR_GRAPH:
+        # Each edge's signals count once per endpoint, as in a per-user neighbour scan.
+        comp_signals = [Counter() for _ in range(len(comps))]
+        membership = comps.membership
+        for (a, _b), sigs in zip(edge_list, edge_signals):
+            counter = comp_signals[membership[a]]
+            for s in sigs.split(","):
+                if s:
+                    counter[s] += 2
+        for idx, comp in enumerate(comps):
+            clusters.append((
+                idx,
+                len(comp),
+                ",".join(nodes[v] for v in comp[:20]),
+                ",".join([f"{s}:{c}" for s, c in comp_signals[idx].most_common(5)]),
+            ))
+
+        clusters = sorted(clusters, key=lambda r: r[1], reverse=True)
         with open(OUT_CLUSTERS, "w", encoding="utf-8", newline="") as fcsv:
-            writer = csv.DictWriter(fcsv, fieldnames=["cluster_id", "size", "users_sample", "top_signals"])
-            writer.writeheader()
+            writer = csv.writer(fcsv)
+            writer.writerow(["cluster_id", "size", "users_sample", "top_signals"])
             writer.writerows(clusters)
 
-        if G.number_of_nodes() > 0:
-            nx.write_gexf(G, OUT_GRAPH)
+        write_gexf(OUT_GRAPH, nodes, edge_list, edge_weights, edge_attr=("signals", edge_signals))
     else:
         with open(OUT_CLUSTERS, "w", encoding="utf-8", newline="") as fcsv:
-            writer = csv.DictWriter(fcsv, fieldnames=["cluster_id", "size", "users_sample", "top_signals"])
-            writer.writeheader()
-
-    # Pass 5: build bipartite user-item graph (explicable graph).
-    B = nx.Graph()
-    edge_limit = MAX_BIP_EDGES
-    cur.execute("SELECT COUNT(*) FROM user_item")
-    total_bip_edges = int(cur.fetchone()[0] or 0)
-    if total_bip_edges > edge_limit:
-        cur.execute(
-            "SELECT user_id, item_id, cnt FROM user_item ORDER BY cnt DESC LIMIT ?",
-            (edge_limit,),
+            csv.writer(fcsv).writerow(["cluster_id", "size", "users_sample", "top_signals"])
+
+    # Pass 5: build bipartite user-item graph (explicable graph) as edge lists, plus
+    # each user's (item, weight) neighbours for the cluster report.
+    bip = ui_counts.items()
+    if len(ui_counts) > MAX_BIP_EDGES:
+        # nlargest is stable: ties keep first-seen order.
+        bip = heapq.nlargest(MAX_BIP_EDGES, bip, key=itemgetter(1))
+
+    bip_idx: dict[str, int] = {}
+    bip_types: dict[str, str] = {}  # same keys/order as bip_idx; the last type seen wins
+    bip_edge_list: list[tuple[int, int]] = []
+    bip_weights: list[int] = []
+    user_bip: dict[str, list[tuple[str, int]]] = defaultdict(list)
+    for key, cnt in bip:
+        user = user_names[key >> 32]
+        item = bip_names[key & 0xFFFFFFFF]
+        u = bip_idx.setdefault(user, len(bip_idx))
+        bip_types[user] = "user"
+        i = bip_idx.setdefault(item, len(bip_idx))
+        bip_types[item] = "item"
+        bip_edge_list.append((u, i))
+        bip_weights.append(int(cnt))
+        user_bip[user].append((item, int(cnt)))
+    bip_edges = len(bip_edge_list)
+
+    if bip_idx:
+        write_gexf(
+            OUT_BIP, list(bip_idx), bip_edge_list, bip_weights,
+            node_attr=("node_type", list(bip_types.values())),
         )
-    else:
-        cur.execute("SELECT user_id, item_id, cnt FROM user_item")
-
-    bip_edges = 0
-    for user_id, item_id, cnt in cur:
-        B.add_node(user_id, node_type="user")
-        B.add_node(item_id, node_type="item")
-        B.add_edge(user_id, item_id, weight=int(cnt))
-        bip_edges += 1
-
-    if B.number_of_nodes() > 0:
-        nx.write_gexf(B, OUT_BIP)
         print("Bipartite graph saved:", OUT_BIP, "edges:", bip_edges)
 
     # T1: top clusters report.
-    if G.number_of_nodes() > 0:
+    if nodes:
         top_clusters = []
-        deg = dict(G.degree(weight="weight"))
-        cluster_signals = {c["cluster_id"]: c["top_signals"] for c in clusters}
-        for idx, comp in enumerate(nx.connected_components(G)):
-            comp = list(comp)
-            top_users = sorted(comp, key=lambda u: deg.get(u, 0), reverse=True)[:10]
+        deg = g.strength(weights="weight")
+        cluster_signals = {cluster_id: top_signals for cluster_id, _size, _sample, top_signals in clusters}
+        for idx, comp in enumerate(comps):
+            top_users = [nodes[v] for v in sorted(comp, key=lambda v: deg[v], reverse=True)[:10]]
+            comp = [nodes[v] for v in comp]
             item_counts = Counter()
             for u in comp:
-                for item in B.neighbors(u) if B.has_node(u) else []:
-                    if str(item).startswith(("DOM:", "RT:", "CONV:", "MENT:@", "TAG:#")):
-                        w = B.edges[u, item].get("weight", 1)
-                        item_counts[item] += int(w)
+                for item, w in user_bip.get(u, ()):
+                    if item.startswith(("DOM:", "RT:", "CONV:", "MENT:@", "TAG:#")):
+                        item_counts[item] += w
             top_items = [i for i, _c in item_counts.most_common(10)]
-            top_clusters.append({
-                "cluster_id": idx,
-                "size": len(comp),
-                "top_signals": cluster_signals.get(idx, ""),
-                "top_users": ",".join(top_users),
-                "top_items": ",".join(top_items),
-            })
-
-        top_clusters = sorted(top_clusters, key=lambda r: r["size"], reverse=True)
+            top_clusters.append((
+                idx,
+                len(comp),
+                cluster_signals.get(idx, ""),
+                ",".join(top_users),
+                ",".join(top_items),
+            ))
+
+        top_clusters = sorted(top_clusters, key=lambda r: r[1], reverse=True)
         with open(OUT_TOP_CLUSTERS, "w", encoding="utf-8", newline="") as fcsv:
-            writer = csv.DictWriter(fcsv, fieldnames=["cluster_id", "size", "top_signals", "top_users", "top_items"])
-            writer.writeheader()
+            writer = csv.writer(fcsv)
+            writer.writerow(["cluster_id", "size", "top_signals", "top_users", "top_items"])
             writer.writerows(top_clusters)
 
     # T2: top edges report.
     top_edges_sorted = sorted(top_edges, key=lambda x: x[0], reverse=True)
     with open(OUT_TOP_EDGES, "w", encoding="utf-8", newline="") as fcsv:
-        writer = csv.DictWriter(fcsv, fieldnames=[
-            "user_a", "user_b", "signals", "signal_counts", "total_occurrences"
-        ])
-        writer.writeheader()
-        for _score, _seq, row in top_edges_sorted:
-            writer.writerow({
-                "user_a": row["user_a"],
-                "user_b": row["user_b"],
-                "signals": row["signals"],
-                "signal_counts": row["signal_counts"],
-                "total_occurrences": row["total_occurrences"],
-            })
+        writer = csv.writer(fcsv)
+        writer.writerow(["user_a", "user_b", "signals", "signal_counts", "total_occurrences"])
+        for _score, _seq, (user_a, user_b, _n, total_occ, signals, signal_counts) in top_edges_sorted:
+            writer.writerow((user_a, user_b, signals, signal_counts, total_occ))
 
     # T3: time window report.
     with open(OUT_TIME_WINDOWS, "w", encoding="utf-8", newline="") as fcsv:
-        writer = csv.DictWriter(fcsv, fieldnames=[
-            "bucket_start", "bucket_end", "active_users", "num_coord_edges_created", "top_signal", "top_item"
-        ])
-        writer.writeheader()
+        writer = csv.writer(fcsv)
+        writer.writerow(["bucket_start", "bucket_end", "active_users", "num_coord_edges_created", "top_signal", "top_item"])
         for bucket_id in sorted(bucket_stats.keys()):
             start_ts = bucket_id * WINDOW_SECS
             end_ts = start_ts + WINDOW_SECS
             row = bucket_stats[bucket_id]
-            writer.writerow({
-                "bucket_start": datetime.fromtimestamp(start_ts, tz=timezone.utc).isoformat(),
-                "bucket_end": datetime.fromtimestamp(end_ts, tz=timezone.utc).isoformat(),
-                "active_users": row.get("active_users", 0),
-                "num_coord_edges_created": row.get("num_coord_edges_created", 0),
-                "top_signal": row.get("top_signal", ""),
-                "top_item": row.get("top_item", ""),
-            })
+            writer.writerow((
+                iso_utc(start_ts),
+                iso_utc(end_ts),
+                row.get("active_users", 0),
+                row.get("num_coord_edges_created", 0),
+                row.get("top_signal", ""),
+                row.get("top_item", ""),
+            ))
 
     conn.close()
 
@@ -454,7 +668,7 @@ def main() -> None:
 
     print("Edges saved:", OUT_EDGES, "count:", edges_written)
     print("Clusters saved:", OUT_CLUSTERS, "count:", len(clusters))
-    if G.number_of_nodes() > 0 and edges_written <= MAX_EDGES_FOR_GRAPH:
+    if nodes and edges_written <= MAX_EDGES_FOR_GRAPH:
         print("Graph saved:", OUT_GRAPH)
 
 
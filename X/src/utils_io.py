@@ -1,7 +1,11 @@
 import json
 import os
 from pathlib import Path
-from typing import Any, Dict, Iterable, List
+from typing import Any, BinaryIO, Dict, Iterable, List, Tuple
+
+import orjson
+
+JSONL_WRITE_BATCH = 2000  # encoded records joined into a single write() call
 
 
 def ensure_dir(path: str) -> None:
@@ -20,23 +24,51 @@ def write_json(path: str, obj: Any) -> None:
 
 
 def read_jsonl(path: str) -> Iterable[Dict[str, Any]]:
-    with open(path, "r", encoding="utf-8") as f:
+    with open(path, "rb", buffering=1 << 20) as f:
         for line in f:
             line = line.strip()
             if not line:
                 continue
-            yield json.loads(line)
+            yield orjson.loads(line)
+
+
+def iter_byte_ranges(path: str, n: int) -> Iterable[Tuple[int, int]]:
+    """Split `path` into ~n (start, end) byte ranges that end on line boundaries."""
+    size = os.path.getsize(path)
+    step = max(1, size // max(1, n))
+    with open(path, "rb") as f:
+        start = 0
+        while start < size:
+            f.seek(min(size, start + step))
+            f.readline()
+            end = f.tell()
+            yield start, end
+            start = end
+
+
+def write_jsonl_rows(f: BinaryIO, rows: Iterable[Dict[str, Any]]) -> int:
+    """Encode rows to an open binary file in batches of JSONL_WRITE_BATCH; returns the row count."""
+    n = 0
+    batch: List[bytes] = []
+    for r in rows:
+        batch.append(orjson.dumps(r, option=orjson.OPT_APPEND_NEWLINE))
+        if len(batch) >= JSONL_WRITE_BATCH:
+            f.write(b"".join(batch))
+            n += len(batch)
+            batch.clear()
+    if batch:
+        f.write(b"".join(batch))
+        n += len(batch)
+    return n
 
 
 def write_jsonl(path: str, rows: Iterable[Dict[str, Any]]) -> None:
     ensure_dir(os.path.dirname(path) or ".")
-    with open(path, "w", encoding="utf-8") as f:
-        for r in rows:
-            f.write(json.dumps(r, ensure_ascii=False) + "\n")
+    with open(path, "wb", buffering=1 << 20) as f:
+        write_jsonl_rows(f, rows)
 
 
 def append_jsonl(path: str, rows: List[Dict[str, Any]]) -> None:
     ensure_dir(os.path.dirname(path) or ".")
-    with open(path, "a", encoding="utf-8") as f:
-        for r in rows:
-            f.write(json.dumps(r, ensure_ascii=False) + "\n")
+    with open(path, "ab", buffering=1 << 20) as f:
+        write_jsonl_rows(f, rows)
@@ -1,11 +1,17 @@
 import hashlib
 import re
+import string
 from urllib.parse import urlparse
 from typing import List, Tuple
 
 
 URL_RE = re.compile(r"(https?://[^\s)]+)", re.IGNORECASE)
 HASHTAG_RE = re.compile(r"(#[A-Za-z0-9_]+)")
+WHITESPACE_RE = re.compile(r"\s+")
+CAPS_WORD_RE = re.compile(r"\b[A-Z]{4,}\b")
+CLICKBAIT_RE = re.compile(r"\b(shocking|bombshell|you won'?t believe|exposed|truth|lies|fraud)\b")
+ASCII_LETTERS = string.ascii_letters.encode("ascii")
+ASCII_UPPER = string.ascii_uppercase.encode("ascii")
 
 
 def hash_id(s: str, salt: str = "yt-osint") -> str:
@@ -17,38 +23,34 @@ def hash_id(s: str, salt: str = "yt-osint") -> str:
 def extract_urls(text: str) -> List[str]:
     if not text:
         return []
-    urls = URL_RE.findall(text)
-    # clean trailing punctuation
-    clean = [u.rstrip(".,;:!?)\"'") for u in urls]
-    return list(dict.fromkeys(clean))
+    # clean trailing punctuation, dedupe in order
+    return list({u.rstrip(".,;:!?)\"'"): None for u in URL_RE.findall(text)})
 
 
 def extract_domains(urls: List[str]) -> List[str]:
-    out = []
+    out = {}
     for u in urls:
         try:
             p = urlparse(u)
             if p.netloc:
-                out.append(p.netloc.lower())
+                out[p.netloc.lower()] = None
         except Exception:
             continue
-    return list(dict.fromkeys(out))
+    return list(out)
 
 
 def extract_hashtags(text: str) -> List[str]:
     if not text:
         return []
-    tags = HASHTAG_RE.findall(text)
-    # normalize lower
-    tags = [t.lower() for t in tags]
-    return list(dict.fromkeys(tags))
+    # normalize lower, dedupe in order
+    return list({t.lower(): None for t in HASHTAG_RE.findall(text)})
 
 
 def normalize_text_basic(text: str) -> str:
     if not text:
         return ""
     t = text.strip()
-    t = re.sub(r"\s+", " ", t)
+    t = WHITESPACE_RE.sub(" ", t)
     return t
 
 
@@ -60,9 +62,18 @@ def sensational_score(text: str) -> float:
     if not text:
         return 0.0
     t = text
-    upper_ratio = sum(1 for c in t if c.isalpha() and c.isupper()) / max(1, sum(1 for c in t if c.isalpha()))
+    if t.isascii():
+        # Count letters with C-level bytes.translate instead of a per-char generator.
+        b = t.encode("ascii")
+        n_alpha = len(b) - len(b.translate(None, ASCII_LETTERS))
+        n_upper = len(b) - len(b.translate(None, ASCII_UPPER))
+    else:
+        letters = list(filter(str.isalpha, t))
+        n_alpha = len(letters)
+        n_upper = sum(map(str.isupper, letters))
+    upper_ratio = n_upper / max(1, n_alpha)
     excls = t.count("!")
     qmarks = t.count("?")
-    caps_words = len(re.findall(r"\b[A-Z]{4,}\b", t))
-    clickbait = len(re.findall(r"\b(shocking|bombshell|you won'?t believe|exposed|truth|lies|fraud)\b", t.lower()))
+    caps_words = len(CAPS_WORD_RE.findall(t))
+    clickbait = len(CLICKBAIT_RE.findall(t.lower()))
     return float(2.0 * upper_ratio + 0.2 * excls + 0.2 * qmarks + 0.3 * caps_words + 0.5 * clickbait)
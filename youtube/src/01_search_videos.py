@@ -21,10 +21,13 @@ Notes:
 
 import os
 import json
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 from typing import Dict, List, Optional, Tuple
 
+import orjson
 from dotenv import load_dotenv
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
@@ -64,8 +67,10 @@ FINAL_VIDEO_CAP = 250
 REGION_CODE = "US"  # e.g., "US"
 RELEVANCE_LANGUAGE = "en"  # e.g., "en"
 
-# Sleep between API calls to be nice (and reduce 429/rate issues)
-SLEEP_BETWEEN_CALLS = 0.15
+# Queries and metadata chunks are fetched concurrently; a shared limiter keeps
+# the total request rate nice (and reduces 429/rate issues)
+FETCH_WORKERS = 8
+MAX_CALLS_PER_SEC = 10
 
 # Output paths
 DATA_DIR = "data"
@@ -92,24 +97,49 @@ def chunked(lst: List[str], n: int) -> List[List[str]]:
     return [lst[i:i+n] for i in range(0, len(lst), n)]
 
 def append_jsonl(path: str, rows: List[dict]) -> None:
-    with open(path, "a", encoding="utf-8") as f:
-        for r in rows:
-            f.write(json.dumps(r, ensure_ascii=False) + "\n")
+    with open(path, "ab") as f:
+        f.writelines(orjson.dumps(r) + b"\n" for r in rows)
 
 
 # ----------------------------
 # YouTube API calls
 # ----------------------------
 
+class RateLimiter:
+    """Spaces calls from all threads at least 1/rate seconds apart."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate
+        self.lock = threading.Lock()
+        self.next_at = time.monotonic()
+
+    def wait(self) -> None:
+        with self.lock:
+            now = time.monotonic()
+            at = max(self.next_at, now)
+            self.next_at = at + self.interval
+        if at > now:
+            time.sleep(at - now)
+
+limiter = RateLimiter(MAX_CALLS_PER_SEC)
+
 def build_client():
     load_dotenv()
     api_key = os.getenv("YT_API_KEY")
     if not api_key:
         raise RuntimeError("Missing YT_API_KEY. Put it in a .env file: YT_API_KEY=YOUR_KEY")
-    return build("youtube", "v3", developerKey=api_key)
+    return build("youtube", "v3", developerKey=api_key, cache_discovery=False)
+
+# googleapiclient clients are not thread-safe: each fetch thread builds its own.
+_local = threading.local()
+
+def client():
+    youtube = getattr(_local, "youtube", None)
+    if youtube is None:
+        youtube = _local.youtube = build_client()
+    return youtube
 
 def search_videos(
-    youtube,
     query: str,
     published_after: str,
     published_before: str,
@@ -118,6 +148,7 @@ def search_videos(
     relevance_language: Optional[str] = None,
 ) -> Tuple[List[str], Dict]:
     """
+    Pages are fetched serially (each needs the previous page token); queries run in parallel.
     Returns:
       - list of video IDs
       - stats dict for logging
@@ -137,8 +168,9 @@ def search_videos(
     }
 
     for _ in range(max_pages):
+        limiter.wait()
         try:
-            req = youtube.search().list(
+            req = client().search().list(
                 part="id",
                 q=query,
                 type="video",
@@ -166,8 +198,6 @@ def search_videos(
                 video_ids.append(vid)
 
         page_token = res.get("nextPageToken")
-        time.sleep(SLEEP_BETWEEN_CALLS)
-
         if not page_token:
             break
 
@@ -175,48 +205,52 @@ def search_videos(
     stats["unique_videos_returned"] = len(video_ids)
     return video_ids, stats
 
-def fetch_video_metadata(youtube, video_ids: List[str]) -> List[dict]:
+def fetch_metadata_chunk(video_ids: List[str]) -> List[dict]:
+    """Metadata for up to 50 video IDs (one videos.list call)."""
+    limiter.wait()
+    try:
+        res = client().videos().list(
+            part="snippet,statistics,contentDetails",
+            id=",".join(video_ids),
+            maxResults=50
+        ).execute()
+    except HttpError as e:
+        # Skip this chunk on error
+        print("videos.list error:", e)
+        time.sleep(1)
+        return []
+
+    results: List[dict] = []
+    for item in res.get("items", []):
+        sn = item.get("snippet", {})
+        stats = item.get("statistics", {})
+        cd = item.get("contentDetails", {})
+        results.append({
+            "video_id": item.get("id"),
+            "channel_id": sn.get("channelId"),
+            "channel_title": sn.get("channelTitle"),
+            "published_at": sn.get("publishedAt"),
+            "title": sn.get("title"),
+            "description": sn.get("description"),
+            "tags": sn.get("tags", []),
+            "category_id": sn.get("categoryId"),
+            "default_language": sn.get("defaultLanguage"),
+            "default_audio_language": sn.get("defaultAudioLanguage"),
+            "view_count": stats.get("viewCount"),
+            "like_count": stats.get("likeCount"),
+            "comment_count": stats.get("commentCount"),
+            "duration": cd.get("duration"),
+        })
+    return results
+
+def fetch_video_metadata(pool: ThreadPoolExecutor, video_ids: List[str]) -> List[dict]:
     """
     Fetch metadata for video IDs using videos.list (cheap).
-    Returns a list of dicts (one per video).
+    Returns a list of dicts (one per video), in chunk order.
     """
     results: List[dict] = []
-    for chunk in chunked(video_ids, 50):  # max 50 IDs per call
-        try:
-            res = youtube.videos().list(
-                part="snippet,statistics,contentDetails",
-                id=",".join(chunk),
-                maxResults=50
-            ).execute()
-        except HttpError as e:
-            # Skip this chunk on error
-            print("videos.list error:", e)
-            time.sleep(1)
-            continue
-
-        for item in res.get("items", []):
-            sn = item.get("snippet", {})
-            stats = item.get("statistics", {})
-            cd = item.get("contentDetails", {})
-            results.append({
-                "video_id": item.get("id"),
-                "channel_id": sn.get("channelId"),
-                "channel_title": sn.get("channelTitle"),
-                "published_at": sn.get("publishedAt"),
-                "title": sn.get("title"),
-                "description": sn.get("description"),
-                "tags": sn.get("tags", []),
-                "category_id": sn.get("categoryId"),
-                "default_language": sn.get("defaultLanguage"),
-                "default_audio_language": sn.get("defaultAudioLanguage"),
-                "view_count": stats.get("viewCount"),
-                "like_count": stats.get("likeCount"),
-                "comment_count": stats.get("commentCount"),
-                "duration": cd.get("duration"),
-            })
-
-        time.sleep(SLEEP_BETWEEN_CALLS)
-
+    for rows in pool.map(fetch_metadata_chunk, chunked(video_ids, 50)):  # max 50 IDs per call
+        results.extend(rows)
     return results
 
 
@@ -232,15 +266,11 @@ def main():
     if os.path.exists(VIDEOS_JSONL_PATH):
         os.remove(VIDEOS_JSONL_PATH)
 
-    youtube = build_client()
-
     all_video_ids: List[str] = []
     search_logs: List[dict] = []
 
-    print("=== Searching videos ===")
-    for q in QUERIES:
-        vids, log = search_videos(
-            youtube=youtube,
+    def search(q: str) -> Tuple[List[str], Dict]:
+        return search_videos(
             query=q,
             published_after=PUBLISHED_AFTER,
             published_before=PUBLISHED_BEFORE,
@@ -248,25 +278,31 @@ def main():
             region_code=REGION_CODE,
             relevance_language=RELEVANCE_LANGUAGE,
         )
-        search_logs.append(log)
-        all_video_ids.extend(vids)
-        print(f"- Query: {q!r} -> {len(vids)} unique videos")
-
-    # De-duplicate across all queries
-    unique_ids = unique_keep_order(all_video_ids)
-    print(f"Total unique videos before cap: {len(unique_ids)}")
-
-    # Cap to a manageable size
-    unique_ids = unique_ids[:FINAL_VIDEO_CAP]
-    print(f"Total unique videos after cap:  {len(unique_ids)}")
-
-    # Save video IDs
-    with open(VIDEO_IDS_PATH, "w", encoding="utf-8") as f:
-        json.dump(unique_ids, f, indent=2)
 
-    # Fetch and save metadata
-    print("=== Fetching video metadata ===")
-    meta = fetch_video_metadata(youtube, unique_ids)
+    # One pool for both phases; the with block shuts it down even if a phase raises.
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as pool:
+        print("=== Searching videos ===")
+        # pool.map keeps query order, so IDs and logs come out as in the serial version
+        for q, (vids, log) in zip(QUERIES, pool.map(search, QUERIES)):
+            search_logs.append(log)
+            all_video_ids.extend(vids)
+            print(f"- Query: {q!r} -> {len(vids)} unique videos")
+
+        # De-duplicate across all queries
+        unique_ids = unique_keep_order(all_video_ids)
+        print(f"Total unique videos before cap: {len(unique_ids)}")
+
+        # Cap to a manageable size
+        unique_ids = unique_ids[:FINAL_VIDEO_CAP]
+        print(f"Total unique videos after cap:  {len(unique_ids)}")
+
+        # Save video IDs
+        with open(VIDEO_IDS_PATH, "w", encoding="utf-8") as f:
+            json.dump(unique_ids, f, indent=2)
+
+        # Fetch and save metadata
+        print("=== Fetching video metadata ===")
+        meta = fetch_video_metadata(pool, unique_ids)
     append_jsonl(VIDEOS_JSONL_PATH, meta)
     print(f"Saved metadata for {len(meta)} videos to {VIDEOS_JSONL_PATH}")
 
@@ -1,5 +1,7 @@
 # src/02_fetch_comments.py
-import os, json, time, re, hashlib
+import os, json, time, re, hashlib, threading
+import orjson
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
@@ -9,7 +11,14 @@ API_KEY = os.getenv("YT_API_KEY")
 if not API_KEY:
     raise RuntimeError("Missing YT_API_KEY in .env")
 
-youtube = build("youtube", "v3", developerKey=API_KEY)
+# googleapiclient clients are not thread-safe: each fetch thread builds its own.
+_local = threading.local()
+
+def yt():
+    client = getattr(_local, "youtube", None)
+    if client is None:
+        client = _local.youtube = build("youtube", "v3", developerKey=API_KEY)
+    return client
 
 DATA_DIR = "data"
 VIDEO_IDS_PATH = os.path.join(DATA_DIR, "video_ids.json")
@@ -18,27 +27,32 @@ PROGRESS_PATH = os.path.join(DATA_DIR, "comments_progress.json")
 ERRORS_PATH = os.path.join(DATA_DIR, "errors.jsonl")
 
 MAX_PAGES_PER_VIDEO = 5     # 5 pages = up to 500 top-level comments
-SLEEP_BETWEEN_CALLS = 0.25  # be gentle
+SLEEP_BETWEEN_CALLS = 0.25  # be gentle (per fetch thread)
+FETCH_WORKERS = 8           # videos fetched concurrently
+RATE_LIMIT_RETRIES = 5      # HTTP 429 retries per page, with exponential backoff
 
-URL_RE = re.compile(r"https?://\S+")
+# One scan yields each URL together with its host (text up to the first "/").
+URL_RE = re.compile(r"(https?://(?=\S)([^/\s]*)\S*)")
 HASHTAG_RE = re.compile(r"#\w+")
 
 def hash_id(s: str) -> str:
     return hashlib.sha256(s.encode("utf-8")).hexdigest()[:16]
 
 def extract(text: str):
-    urls = URL_RE.findall(text)
     hashtags = HASHTAG_RE.findall(text)
-    domains = []
-    for u in urls:
-        d = re.sub(r"^https?://", "", u).split("/")[0].lower()
-        domains.append(d)
+    hits = URL_RE.findall(text)
+    if not hits:
+        return [], [], hashtags
+    urls = [u for u, _ in hits]
+    domains = [d.lower() for _, d in hits]
     return urls, domains, hashtags
 
+def write_jsonl_rows(f, rows):
+    f.writelines(orjson.dumps(r) + b"\n" for r in rows)
+
 def append_jsonl(path, rows):
-    with open(path, "a", encoding="utf-8") as f:
-        for r in rows:
-            f.write(json.dumps(r, ensure_ascii=False) + "\n")
+    with open(path, "ab") as f:
+        write_jsonl_rows(f, rows)
 
 def load_progress():
     if not os.path.exists(PROGRESS_PATH):
@@ -50,19 +64,28 @@ def save_progress(progress):
     with open(PROGRESS_PATH, "w", encoding="utf-8") as f:
         json.dump(progress, f, indent=2)
 
+def execute(req):
+    for attempt in range(RATE_LIMIT_RETRIES + 1):
+        try:
+            return req.execute()
+        except HttpError as e:
+            if getattr(e.resp, "status", None) != 429 or attempt == RATE_LIMIT_RETRIES:
+                raise
+            time.sleep(SLEEP_BETWEEN_CALLS * 2 ** (attempt + 2))
+
 def fetch_comments(video_id: str, max_pages=5):
     rows = []
     token = None
     pages = 0
 
     while pages < max_pages:
-        res = youtube.commentThreads().list(
+        res = execute(yt().commentThreads().list(
             part="snippet",
             videoId=video_id,
             maxResults=100,
             pageToken=token,
             textFormat="plainText"
-        ).execute()
+        ))
 
         for item in res.get("items", []):
             top = item["snippet"]["topLevelComment"]["snippet"]
@@ -92,6 +115,14 @@ def fetch_comments(video_id: str, max_pages=5):
 
     return rows
 
+def fetch_video(video_id: str):
+    """(rows, None) or (None, HttpError) for one video; runs in a fetch thread."""
+    try:
+        return fetch_comments(video_id, max_pages=MAX_PAGES_PER_VIDEO), None
+    except HttpError as e:
+        time.sleep(1)
+        return None, e
+
 def main():
     os.makedirs(DATA_DIR, exist_ok=True)
 
@@ -103,14 +134,22 @@ def main():
 
     total = len(video_ids)
     processed = 0
-
-    for i, vid in enumerate(video_ids, 1):
-        if vid in done:
-            continue
-
-        try:
-            rows = fetch_comments(vid, max_pages=MAX_PAGES_PER_VIDEO)
-            append_jsonl(OUT_COMMENTS, rows)
+    todo = [(i, vid) for i, vid in enumerate(video_ids, 1) if vid not in done]
+
+    # Videos are fetched concurrently; results are consumed in video order, so only the
+    # main thread touches the output, error log and progress files.
+    with ThreadPoolExecutor(max_workers=FETCH_WORKERS) as pool, \
+            open(OUT_COMMENTS, "ab", buffering=1 << 20) as fout:
+        results = pool.map(fetch_video, [vid for _, vid in todo])
+        for (i, vid), (rows, err) in zip(todo, results):
+            if err is not None:
+                append_jsonl(ERRORS_PATH, [{"video_id": vid, "error": str(err)}])
+                print(f"[{i}/{total}] {vid} -> ERROR: {err}")
+                continue
+
+            # One buffered write per video, on disk before the video is marked done.
+            write_jsonl_rows(fout, rows)
+            fout.flush()
 
             done.add(vid)
             progress["done_videos"] = sorted(done)
@@ -119,12 +158,6 @@ def main():
             processed += 1
             print(f"[{i}/{total}] {vid} -> {len(rows)} comments (processed {processed})")
 
-        except HttpError as e:
-            err = {"video_id": vid, "error": str(e)}
-            append_jsonl(ERRORS_PATH, [err])
-            print(f"[{i}/{total}] {vid} -> ERROR: {e}")
-            time.sleep(1)
-
     print("Done. Comments saved to:", OUT_COMMENTS)
 
 if __name__ == "__main__":
@@ -1,34 +1,43 @@
-import json
-from datetime import datetime, timezone
+import orjson
+import pyarrow as pa
+import pyarrow.parquet as pq
 
 IN_PATH = "data/comments.jsonl"
 OUT_PATH = "data/comments_filtered.jsonl"
+# Columnar copy of the fields 04/06/07 use, so the JSONL is parsed only here.
+OUT_PARQUET = "data/comments_filtered.parquet"
+PARQUET_SCHEMA = pa.schema([
+    ("author_id", pa.string()),
+    ("video_id", pa.string()),
+    ("published_at", pa.string()),
+    ("domains", pa.list_(pa.string())),
+])
 
+# YouTube timestamps are fixed-width UTC ("2025-12-04T16:52:09Z"), so string
+# order is time order and the window check needs no datetime parsing.
 START = "2024-10-20T00:00:00Z"
 END   = "2024-11-10T00:00:00Z"
 
-def parse_yt(ts: str) -> datetime:
-    # "2025-12-04T16:52:09Z"
-    return datetime.strptime(ts, "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)
-
-start_dt = parse_yt(START)
-end_dt = parse_yt(END)
-
 kept = 0
 total = 0
+columns = {name: [] for name in PARQUET_SCHEMA.names}
 
-with open(IN_PATH, "r", encoding="utf-8") as fin, open(OUT_PATH, "w", encoding="utf-8") as fout:
+with open(IN_PATH, "rb", buffering=1 << 20) as fin, open(OUT_PATH, "wb", buffering=1 << 20) as fout:
     for line in fin:
         total += 1
-        row = json.loads(line)
+        row = orjson.loads(line)
         ts = row.get("published_at")
         if not ts:
             continue
-        dt = parse_yt(ts)
-        if start_dt <= dt <= end_dt:
-            fout.write(json.dumps(row, ensure_ascii=False) + "\n")
+        if START <= ts <= END:
+            # Kept lines are copied as-is, no re-serialization.
+            fout.write(line if line.endswith(b"\n") else line + b"\n")
+            for name, values in columns.items():
+                values.append(row.get(name))
             kept += 1
 
+pq.write_table(pa.table(columns, schema=PARQUET_SCHEMA), OUT_PARQUET, compression="zstd")
+
 print(f"Total comments: {total}")
 print(f"Kept in window [{START} .. {END}]: {kept}")
-print(f"Saved: {OUT_PATH}")
+print(f"Saved: {OUT_PATH} + {OUT_PARQUET}")
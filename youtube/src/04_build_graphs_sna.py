@@ -1,51 +1,84 @@
-import os, json
-from collections import defaultdict, Counter
+import os, json, heapq, random
+import multiprocessing as mp
 from datetime import datetime
+from operator import itemgetter
+import igraph as ig
 import networkx as nx
+import numpy as np
+import orjson
+import pandas as pd
+import scipy.sparse as sp
 
-# Community detection (Louvain)
-import community as community_louvain  # python-louvain
-
-IN_PATH = "data/comments_filtered.jsonl"
+IN_PATH = "data/comments_filtered.parquet"  # written by 03_filter_comments_by_date.py
 OUT_DIR = "data"
 
 OUT_BIPARTITE = os.path.join(OUT_DIR, "graph_user_video.gexf")
 OUT_USER = os.path.join(OUT_DIR, "graph_user_user.gexf")
 OUT_STATS = os.path.join(OUT_DIR, "sna_stats.json")
+OUT_USER_NPZ = os.path.join(OUT_DIR, "graph_user_user.npz")  # all projection edges + node attrs, read by 08
+OUT_USER_W2 = os.path.join(OUT_DIR, "graph_user_user_w2.npz")  # weight >= MIN_W edges + node attrs, read by 05
+OUT_USER_IDS = os.path.join(OUT_DIR, "graph_user_user_ids.json")  # author_id of each user id in the npz
+
+MIN_W = 2  # keep only pairs who co-commented on >=2 shared videos in the compact projection
+WRITE_GEXF = False  # also export the user-user graph as GEXF (Gephi etc.)
+LOUVAIN_STARTS = 4  # seeded Louvain runs (seeds 0..N-1); the highest-modularity partition is kept
+LOUVAIN_WORKERS = None  # processes for the Louvain starts; None = os.cpu_count()
 
 def parse_yt(ts: str) -> datetime:
-    return datetime.strptime(ts, "%Y-%m-%dT%H:%M:%SZ")
+    # fromisoformat is a C parser; the naive UTC result matches the old "%Y-%m-%dT%H:%M:%SZ" strptime.
+    return datetime.fromisoformat(ts.replace("Z", "+00:00")).replace(tzinfo=None)
+
+_graph = None
+
+def _set_graph(g):
+    global _graph
+    _graph = g
+
+def louvain_start(seed: int):
+    """(modularity, membership) of one Louvain run on _graph; igraph draws from Python's random."""
+    random.seed(seed)
+    part = _graph.community_multilevel(weights="weight")
+    return _graph.modularity(part.membership, weights="weight"), part.membership
 
 def main():
     os.makedirs(OUT_DIR, exist_ok=True)
 
-    # (author_id, video_id) -> comment count
-    uv_counts = defaultdict(int)
-
-    # for basic dataset stats
-    users = set()
-    videos = set()
-    dates = []
-
-    with open(IN_PATH, "r", encoding="utf-8") as f:
-        for line in f:
-            r = json.loads(line)
-            u = r["author_id"]
-            v = r["video_id"]
-            uv_counts[(u, v)] += 1
-            users.add(u)
-            videos.add(v)
-            if r.get("published_at"):
-                dates.append(parse_yt(r["published_at"]))
+    df = pd.read_parquet(IN_PATH, columns=["author_id", "video_id", "published_at"])
+
+    # Users and videos as integer codes in first-seen order (rows missing either id are skipped);
+    # strings are only looked up again when writing outputs.
+    pairs = df[df["author_id"].notna() & df["video_id"].notna()]
+    u_codes, user_names = pd.factorize(pairs["author_id"])
+    v_codes, video_names = pd.factorize(pairs["video_id"])
+    user_ids = user_names.tolist()
+    video_ids = video_names.tolist()
+    n_users, n_videos = len(user_ids), len(video_ids)
+
+    # (user, video) -> comment count, in first-seen order
+    keys, first, counts = np.unique(
+        u_codes.astype(np.int64) * n_videos + v_codes, return_index=True, return_counts=True
+    )
+    order = np.argsort(first, kind="stable")
+    uv_user = (keys[order] // n_videos).astype(np.int32)
+    uv_video = (keys[order] % n_videos).astype(np.int32)
+    uv_weight = counts[order]
+
+    # for basic dataset stats; fixed-width timestamps, so string min/max is time min/max
+    users = df["author_id"].unique()
+    videos = df["video_id"].unique()
+    published = df["published_at"].dropna()
+    published = published[published != ""]
+    dates = [parse_yt(published.min()), parse_yt(published.max())] if len(published) else []
 
     # 1) Build bipartite graph (User <-> Video)
+    # add_edges_from creates endpoints in first-seen order; node types are set in bulk.
     B = nx.Graph()
-    for (u, v), w in uv_counts.items():
-        if not B.has_node(u):
-            B.add_node(u, node_type="user")
-        if not B.has_node(v):
-            B.add_node(v, node_type="video")
-        B.add_edge(u, v, weight=w)
+    B.add_edges_from(
+        (user_ids[u], video_ids[v], {"weight": w})
+        for u, v, w in zip(uv_user.tolist(), uv_video.tolist(), uv_weight.tolist())
+    )
+    nx.set_node_attributes(B, dict.fromkeys(users, "user"), "node_type")
+    nx.set_node_attributes(B, dict.fromkeys(videos, "video"), "node_type")
 
     nx.write_gexf(B, OUT_BIPARTITE)
     print(f"[OK] Bipartite graph saved: {OUT_BIPARTITE}")
@@ -53,67 +86,106 @@ def main():
     print(f"     Users={len(users)} Videos={len(videos)}")
 
     # 2) Project to user-user co-commenter graph
-    # video -> set(users)
-    video_to_users = defaultdict(set)
-    for (u, v), w in uv_counts.items():
-        video_to_users[v].add(u)
-
-    G = nx.Graph()
-    for v, uset in video_to_users.items():
-        ulist = list(uset)
-        # connect all pairs of users who commented on the same video
-        for i in range(len(ulist)):
-            for j in range(i + 1, len(ulist)):
-                a, b = ulist[i], ulist[j]
-                if G.has_edge(a, b):
-                    G[a][b]["weight"] += 1
-                else:
-                    G.add_edge(a, b, weight=1)
-
-    # Add degree as node attribute
-    for n in G.nodes():
-        G.nodes[n]["degree"] = G.degree(n)
+    # With M the binary user x video incidence matrix, (M @ M.T)[a, b] counts the
+    # videos both a and b commented on; keep the upper triangle only (a < b).
+    M = sp.csr_matrix(
+        (np.ones(len(uv_user), dtype=np.int32), (uv_user, uv_video)),
+        shape=(n_users, n_videos),
+    )
+    W = sp.triu(M @ M.T, k=1).tocoo()
+
+    # Degree / weighted degree straight from the projection's triplets.
+    deg = np.bincount(W.row, minlength=n_users) + np.bincount(W.col, minlength=n_users)
+    wdeg = (np.bincount(W.row, weights=W.data, minlength=n_users)
+            + np.bincount(W.col, weights=W.data, minlength=n_users)).astype(np.int64)
+    linked = np.flatnonzero(deg).tolist()
+
+    # Users sharing no video with anyone stay out of the graph, as before.
+    # igraph vertex k is user linked[k]; SNA stats + Louvain run on its C core.
+    pos = np.full(n_users, -1, dtype=np.int64)
+    pos[linked] = np.arange(len(linked))
+    g = ig.Graph(
+        n=len(linked),
+        edges=list(zip(pos[W.row].tolist(), pos[W.col].tolist())),
+        edge_attrs={"weight": W.data.tolist()},
+    )
 
     # 3) Basic SNA metrics
-    n_nodes = G.number_of_nodes()
-    n_edges = G.number_of_edges()
-    density = nx.density(G) if n_nodes > 1 else 0.0
-    avg_clustering = nx.average_clustering(G) if n_nodes > 1 else 0.0
+    n_nodes = g.vcount()
+    n_edges = g.ecount()
+    density = n_edges / (n_nodes * (n_nodes - 1)) * 2 if n_nodes > 1 else 0.0
+    avg_clustering = g.transitivity_avglocal_undirected(mode="zero") if n_nodes > 1 else 0.0
 
     # Connected components
-    components = list(nx.connected_components(G))
-    largest_cc_size = max((len(c) for c in components), default=0)
+    largest_cc_size = max(g.connected_components().sizes(), default=0)
 
     # Louvain communities (works on undirected graphs)
     # If graph is empty, skip
     community_count = 0
     modularity = None
+    community = np.full(n_users, -1, dtype=np.int32)
     if n_edges > 0:
-        partition = community_louvain.best_partition(G, weight="weight")
-        # store community id on each node
-        for node, cid in partition.items():
-            G.nodes[node]["community"] = cid
-        community_count = len(set(partition.values()))
-        modularity = community_louvain.modularity(partition, G, weight="weight")
-
-    # Top nodes by degree and weighted degree
-    weighted_degree = {n: sum(d.get("weight", 1) for _, _, d in G.edges(n, data=True)) for n in G.nodes()}
-    top_degree = sorted(G.degree, key=lambda x: x[1], reverse=True)[:10]
-    top_wdegree = sorted(weighted_degree.items(), key=lambda x: x[1], reverse=True)[:10]
-
-    nx.write_gexf(G, OUT_USER)
-    print(f"[OK] User-user graph saved: {OUT_USER}")
+        # igraph holds the GIL, so the independent starts run in worker processes
+        # (each gets one copy of the graph); seeds keep the result reproducible.
+        seeds = range(LOUVAIN_STARTS)
+        workers = min(LOUVAIN_STARTS, LOUVAIN_WORKERS or os.cpu_count() or 1)
+        if workers > 1:
+            with mp.Pool(workers, initializer=_set_graph, initargs=(g,)) as pool:
+                starts = pool.map(louvain_start, seeds)
+        else:
+            _set_graph(g)
+            starts = list(map(louvain_start, seeds))
+        # max keeps the first (lowest-seed) start on ties
+        modularity, membership = max(starts, key=itemgetter(0))
+        community[linked] = membership
+        community_count = max(membership) + 1
+
+    # Top nodes by degree and weighted degree (nlargest is stable: ties keep user order)
+    top_degree = heapq.nlargest(10, ((user_ids[i], int(deg[i])) for i in linked), key=itemgetter(1))
+    top_wdegree = heapq.nlargest(10, ((user_ids[i], int(wdeg[i])) for i in linked), key=itemgetter(1))
+
+    # Edge triplets over user ids + node attrs are what 05/08 read; GEXF is export-only.
+    # The weight >= MIN_W threshold is applied here, so 05 only loads the compact file.
+    for path, min_w in ((OUT_USER_NPZ, 1), (OUT_USER_W2, MIN_W)):
+        keep = W.data >= min_w
+        np.savez_compressed(
+            path,
+            src=W.row[keep].astype(np.int32),
+            dst=W.col[keep].astype(np.int32),
+            weight=W.data[keep].astype(np.int32),
+            degree=deg.astype(np.int32),
+            community=community,
+            min_w=min_w,
+            n_edges=n_edges,
+        )
+    with open(OUT_USER_IDS, "wb") as f:
+        f.write(orjson.dumps(user_ids))
+    print(f"[OK] User-user graph saved: {OUT_USER_NPZ} + {OUT_USER_IDS}")
+    print(f"[OK] Compact w>={MIN_W} projection saved: {OUT_USER_W2}")
     print(f"     Nodes={n_nodes}  Edges={n_edges}")
     print(f"     Density={density:.6f}  AvgClustering={avg_clustering:.4f}")
     if modularity is not None:
         print(f"     Louvain communities={community_count}  Modularity={modularity:.4f}")
 
+    if WRITE_GEXF:
+        G = nx.Graph()
+        for i in linked:
+            attrs = {"degree": int(deg[i])}
+            if community[i] >= 0:
+                attrs["community"] = int(community[i])
+            G.add_node(user_ids[i], **attrs)
+        G.add_weighted_edges_from(
+            (user_ids[a], user_ids[b], w) for a, b, w in zip(W.row.tolist(), W.col.tolist(), W.data.tolist())
+        )
+        nx.write_gexf(G, OUT_USER)
+        print(f"[OK] GEXF export saved: {OUT_USER}")
+
     # Save stats for your report
     stats = {
         "input_file": IN_PATH,
         "date_min": dates and min(dates).isoformat() or None,
         "date_max": dates and max(dates).isoformat() or None,
-        "comments_in_window": sum(uv_counts.values()),
+        "comments_in_window": len(pairs),
         "unique_users": len(users),
         "unique_videos": len(videos),
         "bipartite_nodes": B.number_of_nodes(),
@@ -1,24 +1,32 @@
 import networkx as nx
+import numpy as np
+import orjson
 
-IN_GEXF = "data/graph_user_user.gexf"
+# Precomputed by 04_build_graphs_sna.py: weight >= MIN_W edges over user ids,
+# plus per-user degree/community, so the full user-user GEXF is not re-read.
+IN_NPZ = "data/graph_user_user_w2.npz"
+IN_IDS = "data/graph_user_user_ids.json"
 OUT_GEXF = "data/graph_user_user_w2.gexf"
 
-MIN_W = 2  # keep only pairs who co-commented on >=2 shared videos
+w2 = np.load(IN_NPZ)
+with open(IN_IDS, "rb") as f:
+    user_ids = orjson.loads(f.read())
+MIN_W = int(w2["min_w"])  # set in 04_build_graphs_sna.py
 
-G = nx.read_gexf(IN_GEXF)
+src, dst, weight = w2["src"].tolist(), w2["dst"].tolist(), w2["weight"].tolist()
+degree, community = w2["degree"], w2["community"]
 
 H = nx.Graph()
-for u, v, d in G.edges(data=True):
-    w = int(float(d.get("weight", 1)))
-    if w >= MIN_W:
-        H.add_edge(u, v, weight=w)
+H.add_weighted_edges_from((user_ids[a], user_ids[b], w) for a, b, w in zip(src, dst, weight))
 
 # keep node attributes if present
-for n in H.nodes():
-    if n in G.nodes():
-        H.nodes[n].update(G.nodes[n])
+for i in dict.fromkeys(src + dst):
+    attrs = H.nodes[user_ids[i]]
+    attrs["degree"] = int(degree[i])
+    if community[i] >= 0:
+        attrs["community"] = int(community[i])
 
-print("Original:", G.number_of_nodes(), "nodes,", G.number_of_edges(), "edges")
+print("Original:", int((degree > 0).sum()), "nodes,", int(w2["n_edges"]), "edges")
 print("Filtered:", H.number_of_nodes(), "nodes,", H.number_of_edges(), "edges", f"(min_w={MIN_W})")
 
 nx.write_gexf(H, OUT_GEXF)
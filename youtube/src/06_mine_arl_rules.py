@@ -1,10 +1,12 @@
-import json
+import orjson
+import numpy as np
 import pandas as pd
+import pyarrow.parquet as pq
+import scipy.sparse as sp
 from collections import defaultdict
-from mlxtend.preprocessing import TransactionEncoder
-from mlxtend.frequent_patterns import apriori, association_rules
+from mlxtend.frequent_patterns import association_rules, fpgrowth
 
-COMMENTS_IN = "data/comments_filtered.jsonl"
+COMMENTS_IN = "data/comments_filtered.parquet"  # written by 03_filter_comments_by_date.py
 VIDEOS_META = "data/videos.jsonl"
 
 OUT_RULES = "data/arl_rules_fixed.csv"
@@ -15,11 +17,15 @@ MIN_CONFIDENCE = 0.30
 MIN_LIFT = 1.2
 MAX_ITEMS_PER_TX = 80
 
+# Element-wise over object arrays of frozensets (cheaper than Series.apply).
+itemset_len = np.vectorize(len, otypes=[np.int64])
+join_sorted = np.vectorize(lambda s: ", ".join(sorted(s)), otypes=[object])
+
 def load_video_to_channel():
     v2c = {}
-    with open(VIDEOS_META, "r", encoding="utf-8") as f:
+    with open(VIDEOS_META, "rb", buffering=1 << 20) as f:
         for line in f:
-            r = json.loads(line)
+            r = orjson.loads(line)
             vid = r.get("video_id")
             ch  = r.get("channel_id")
             if vid and ch:
@@ -33,23 +39,19 @@ def main():
     total = 0
     has_domains = 0
 
-    with open(COMMENTS_IN, "r", encoding="utf-8") as f:
-        for line in f:
-            total += 1
-            r = json.loads(line)
-            u = r["author_id"]
-            vid = r["video_id"]
-
-            ch = v2c.get(vid)
-            if ch:
-                tx[u].add(f"CH:{ch}")
-
-            doms = r.get("domains", [])
-            if doms:
-                has_domains += 1
-                for d in doms:
-                    if d:
-                        tx[u].add(f"DOM:{d.lower()}")
+    comments = pq.read_table(COMMENTS_IN, columns=["author_id", "video_id", "domains"])
+    for u, vid, doms in zip(*(comments.column(c).to_pylist() for c in ("author_id", "video_id", "domains"))):
+        total += 1
+
+        ch = v2c.get(vid)
+        if ch:
+            tx[u].add(f"CH:{ch}")
+
+        if doms:
+            has_domains += 1
+            for d in doms:
+                if d:
+                    tx[u].add(f"DOM:{d.lower()}")
 
     transactions = []
     for _, items in tx.items():
@@ -63,16 +65,24 @@ def main():
     print("Transactions (per user):", len(transactions))
     print("Comments with domains:", has_domains, f"({has_domains/total:.2%})")
 
-    te = TransactionEncoder()
-    te_ary = te.fit(transactions).transform(transactions)
-    df = pd.DataFrame(te_ary, columns=te.columns_)
-
-    freq = apriori(df, min_support=MIN_SUPPORT, use_colnames=True)
+    # One-hot CSR built straight from item indices (same sorted columns TransactionEncoder used).
+    columns = sorted({it for items in transactions for it in items})
+    col_idx = {it: j for j, it in enumerate(columns)}
+    rows = np.repeat(np.arange(len(transactions)), [len(items) for items in transactions])
+    cols = np.fromiter((col_idx[it] for items in transactions for it in items), dtype=np.int64, count=len(rows))
+    onehot = sp.csr_matrix(
+        (np.ones(len(rows), dtype=bool), (rows, cols)),
+        shape=(len(transactions), len(columns)),
+    )
+    df = pd.DataFrame.sparse.from_spmatrix(onehot, columns=columns)
+
+    # FP-growth finds the same frequent itemsets as apriori without generating candidates.
+    freq = fpgrowth(df, min_support=MIN_SUPPORT, use_colnames=True)
     if len(freq) == 0:
         print("No frequent itemsets. Lower MIN_SUPPORT.")
         return
 
-    freq["itemset_len"] = freq["itemsets"].apply(lambda s: len(s))
+    freq["itemset_len"] = itemset_len(freq["itemsets"].to_numpy())
     freq = freq.sort_values(["itemset_len", "support"], ascending=[False, False])
     freq.to_csv(OUT_FREQ, index=False)
     print("Frequent itemsets saved:", OUT_FREQ, "count:", len(freq))
@@ -87,8 +97,8 @@ def main():
     rules = rules[rules["lift"] >= MIN_LIFT].copy()
     rules = rules.sort_values(["lift", "confidence", "support"], ascending=[False, False, False])
 
-    rules["antecedents"] = rules["antecedents"].apply(lambda s: ", ".join(sorted(list(s))))
-    rules["consequents"] = rules["consequents"].apply(lambda s: ", ".join(sorted(list(s))))
+    rules["antecedents"] = join_sorted(rules["antecedents"].to_numpy())
+    rules["consequents"] = join_sorted(rules["consequents"].to_numpy())
 
     rules.to_csv(OUT_RULES, index=False)
     print("Rules saved:", OUT_RULES, "count:", len(rules))
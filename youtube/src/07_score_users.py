@@ -1,8 +1,11 @@
-import json
+import orjson
+import numpy as np
 import pandas as pd
+import scipy.sparse as sp
+import pyarrow.parquet as pq
 from collections import defaultdict
 
-COMMENTS_IN = "data/comments_filtered.jsonl"
+COMMENTS_IN = "data/comments_filtered.parquet"  # written by 03_filter_comments_by_date.py
 VIDEOS_META = "data/videos.jsonl"
 RULES_CSV = "data/arl_rules_fixed.csv"
 
@@ -15,9 +18,9 @@ MIN_CONF = 0.8  # keep high-confidence rules
 
 def load_video_to_channel():
     v2c = {}
-    with open(VIDEOS_META, "r", encoding="utf-8") as f:
+    with open(VIDEOS_META, "rb", buffering=1 << 20) as f:
         for line in f:
-            r = json.loads(line)
+            r = orjson.loads(line)
             vid = r.get("video_id")
             ch  = r.get("channel_id")
             if vid and ch:
@@ -29,14 +32,11 @@ def main():
 
     # user -> set(CH:...)
     user_items = defaultdict(set)
-    with open(COMMENTS_IN, "r", encoding="utf-8") as f:
-        for line in f:
-            r = json.loads(line)
-            u = r["author_id"]
-            vid = r["video_id"]
-            ch = v2c.get(vid)
-            if ch:
-                user_items[u].add(f"CH:{ch}")
+    comments = pq.read_table(COMMENTS_IN, columns=["author_id", "video_id"])
+    for u, vid in zip(comments.column("author_id").to_pylist(), comments.column("video_id").to_pylist()):
+        ch = v2c.get(vid)
+        if ch:
+            user_items[u].add(f"CH:{ch}")
 
     # Load rules
     rules = pd.read_csv(RULES_CSV)
@@ -51,22 +51,36 @@ def main():
             return set()
         return set(x.strip() for x in str(s).split(",") if x.strip())
 
-    rule_ants = [to_set(s) for s in rules["antecedents"].tolist()]
-    rule_cons = [to_set(s) for s in rules["consequents"].tolist()]
+    # Empty antecedents never fire; drop them before building the rule matrix.
+    rule_ants = [ant for ant in (to_set(s) for s in rules["antecedents"].tolist()) if ant]
+
+    # X (users x items) and R (rules x items) over the antecedent vocabulary:
+    # a rule fires for a user iff (X @ R.T)[u, r] == |antecedent r|.
+    item_idx = {it: j for j, it in enumerate(sorted(set().union(*rule_ants)))}
+    users = list(user_items)
+
+    def incidence(item_sets):
+        rows, cols = [], []
+        for i, items in enumerate(item_sets):
+            for it in items & item_idx.keys():
+                rows.append(i)
+                cols.append(item_idx[it])
+        return sp.csr_matrix(
+            (np.ones(len(rows), dtype=np.int32), (rows, cols)),
+            shape=(len(item_sets), len(item_idx)),
+        )
 
-    rows = []
-    for u, items in user_items.items():
-        hits = 0
-        for ant, con in zip(rule_ants, rule_cons):
-            if ant and ant.issubset(items):
-                hits += 1
-        rows.append({
-            "author_id": u,
-            "num_channels": len(items),
-            "rule_hits": hits
-        })
+    X = incidence([user_items[u] for u in users])
+    R = incidence(rule_ants)
+    ant_len = np.asarray(R.sum(axis=1)).ravel()
+    P = (X @ R.T).tocoo()
+    hits = np.bincount(P.row[P.data == ant_len[P.col]], minlength=len(users))
 
-    df = pd.DataFrame(rows).sort_values(["rule_hits","num_channels"], ascending=[False, False])
+    df = pd.DataFrame({
+        "author_id": users,
+        "num_channels": [len(user_items[u]) for u in users],
+        "rule_hits": hits,
+    }).sort_values(["rule_hits","num_channels"], ascending=[False, False])
     df.to_csv(OUT_USERS, index=False)
     print("Saved:", OUT_USERS)
     print(df.head(20).to_string(index=False))
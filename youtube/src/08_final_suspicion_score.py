@@ -3,7 +3,8 @@
 Final suspicion scoring (SNA + ARL)
 
 Inputs (already produced by your pipeline):
-- data/graph_user_user.gexf              (user-user co-commenter graph with edge weight + louvain community attr)
+- data/graph_user_user.npz               (user-user co-commenter edges with weight + louvain community per user)
+- data/graph_user_user_ids.json          (author_id of each user id in the npz)
 - data/user_rule_hits.csv                (author_id, num_channels, rule_hits)
 Optionally:
 - data/sna_stats.json                    (not required)
@@ -27,14 +28,16 @@ import os
 import json
 import math
 import numpy as np
+import orjson
 import pandas as pd
-import networkx as nx
+import scipy.sparse as sp
 from collections import defaultdict
 
 # -----------------------
 # CONFIG (tune if needed)
 # -----------------------
-GEXF_IN = "data/graph_user_user.gexf"
+GRAPH_IN = "data/graph_user_user.npz"  # written by 04_build_graphs_sna.py
+GRAPH_IDS_IN = "data/graph_user_user_ids.json"
 RULE_HITS_IN = "data/user_rule_hits.csv"
 
 OUT_USER = "data/final_user_scores.csv"
@@ -62,83 +65,64 @@ def zscore(series: pd.Series) -> pd.Series:
     """Safe z-score (returns 0s if constant)."""
     if series.empty:
         return series
-    mu = series.mean()
-    sigma = series.std(ddof=0)
+    a = series.to_numpy(dtype=np.float64)
+    mu = a.mean()
+    sigma = a.std()
     if sigma == 0 or math.isnan(sigma):
-        return pd.Series([0.0] * len(series), index=series.index)
-    return (series - mu) / sigma
+        return pd.Series(np.zeros_like(a), index=series.index)
+    return pd.Series((a - mu) / sigma, index=series.index)
 
-def weighted_degree(G: nx.Graph) -> dict:
+def weighted_degree(src: np.ndarray, dst: np.ndarray, weight: np.ndarray, n: int) -> np.ndarray:
     """Sum of edge weights for each node."""
-    wd = {}
-    for n in G.nodes():
-        s = 0.0
-        for _, _, d in G.edges(n, data=True):
-            w = d.get("weight", 1)
-            try:
-                w = float(w)
-            except Exception:
-                w = 1.0
-            s += w
-        wd[n] = s
-    return wd
-
-def community_density_subgraph(G: nx.Graph, nodes: list) -> float:
-    """Density of induced subgraph on nodes (simple unweighted density)."""
-    if len(nodes) <= 1:
+    w = weight.astype(np.float64)
+    return np.bincount(src, weights=w, minlength=n) + np.bincount(dst, weights=w, minlength=n)
+
+def filtered_adjacency(src: np.ndarray, dst: np.ndarray, weight: np.ndarray, n: int, min_w: int) -> sp.csr_matrix:
+    """Symmetric 0/1 adjacency of the edges with weight >= min_w (density computation only)."""
+    keep = weight >= min_w
+    rows, cols = src[keep], dst[keep]
+    return sp.csr_matrix(
+        (np.ones(2 * len(rows), dtype=np.int8), (np.concatenate([rows, cols]), np.concatenate([cols, rows]))),
+        shape=(n, n),
+    )
+
+def community_density(A: sp.csr_matrix, idx: np.ndarray) -> float:
+    """Density of the subgraph of A induced by idx (simple unweighted density)."""
+    k = len(idx)
+    if k <= 1:
         return 0.0
-    H = G.subgraph(nodes)
-    return nx.density(H)
-
-def build_filtered_graph_for_density(G: nx.Graph, min_w: int) -> nx.Graph:
-    """Filter edges by weight threshold for density computation only."""
-    H = nx.Graph()
-    for u, v, d in G.edges(data=True):
-        w = d.get("weight", 1)
-        try:
-            w = int(float(w))
-        except Exception:
-            w = 1
-        if w >= min_w:
-            H.add_edge(u, v, weight=w)
-    # keep node attrs
-    for n in H.nodes():
-        if n in G.nodes():
-            H.nodes[n].update(G.nodes[n])
-    return H
+    m = A[idx][:, idx].nnz // 2
+    return m / (k * (k - 1)) * 2 if m else 0.0
 
 
 # -----------------------
 # Main
 # -----------------------
 def main():
-    if not os.path.exists(GEXF_IN):
-        raise FileNotFoundError(f"Missing {GEXF_IN}")
+    if not os.path.exists(GRAPH_IN):
+        raise FileNotFoundError(f"Missing {GRAPH_IN}")
     if not os.path.exists(RULE_HITS_IN):
         raise FileNotFoundError(f"Missing {RULE_HITS_IN}")
 
-    # 1) Load graph (user-user)
-    G = nx.read_gexf(GEXF_IN)
-    print("Loaded graph:", G.number_of_nodes(), "nodes,", G.number_of_edges(), "edges")
-
-    # Community id should already be present from your Louvain step
-    # But if missing, we assign community=-1
-    comm = {}
-    for n, attrs in G.nodes(data=True):
-        cid = attrs.get("community", -1)
-        try:
-            cid = int(cid)
-        except Exception:
-            cid = -1
-        comm[n] = cid
+    # 1) Load graph (user-user): edge triplets over user ids, users without edges are not in the graph
+    graph = np.load(GRAPH_IN)
+    with open(GRAPH_IDS_IN, "rb") as f:
+        user_ids = orjson.loads(f.read())
+    src, dst, weight = graph["src"], graph["dst"], graph["weight"]
+    degree = graph["degree"].astype(np.int64)
+    # Community id comes from the Louvain step in 04 (-1 if none was assigned)
+    community = graph["community"].astype(np.int64)
+    linked = np.flatnonzero(degree)
+    n_users = len(user_ids)
+    print("Loaded graph:", len(linked), "nodes,", len(weight), "edges")
 
     # 2) Compute SNA features
-    wd = weighted_degree(G)
+    wd = weighted_degree(src, dst, weight, n_users)
     df_sna = pd.DataFrame({
-        "author_id": list(wd.keys()),
-        "weighted_degree": list(wd.values()),
-        "community": [comm.get(a, -1) for a in wd.keys()],
-        "degree": [G.degree(a) for a in wd.keys()],
+        "author_id": [user_ids[i] for i in linked.tolist()],
+        "weighted_degree": wd[linked],
+        "community": community[linked],
+        "degree": degree[linked],
     })
 
     # 3) Load ARL features (rule hits)
@@ -154,16 +138,20 @@ def main():
     df["num_channels"] = df.get("num_channels", pd.Series([0] * len(df))).fillna(0).astype(int)
 
     # 5) Community-level density (computed on a filtered graph for interpretability)
-    Gd = build_filtered_graph_for_density(G, COMM_DENSITY_MIN_EDGE_WEIGHT)
+    # Only nodes with a kept edge count towards a community's density, as in the
+    # induced subgraph of the filtered graph.
+    A = filtered_adjacency(src, dst, weight, n_users, COMM_DENSITY_MIN_EDGE_WEIGHT)
+    in_filtered = np.diff(A.indptr) > 0
     comm_to_nodes = defaultdict(list)
-    for a, cid in df[["author_id", "community"]].itertuples(index=False):
-        comm_to_nodes[int(cid)].append(a)
+    for i, cid in zip(linked.tolist(), community[linked].tolist()):
+        comm_to_nodes[cid].append(i)
 
     comm_density = {}
     comm_size = {}
     for cid, nodes in comm_to_nodes.items():
         comm_size[cid] = len(nodes)
-        comm_density[cid] = community_density_subgraph(Gd, nodes)
+        idx = np.asarray(nodes, dtype=np.int64)
+        comm_density[cid] = community_density(A, idx[in_filtered[idx]])
 
     df["community_size"] = df["community"].map(lambda x: comm_size.get(int(x), 0))
     df["community_density_w2"] = df["community"].map(lambda x: comm_density.get(int(x), 0.0))
@@ -198,11 +186,10 @@ def main():
     ).reset_index()
 
     # Add "top users" per community (IDs only, still anonymized)
-    top_users_per_comm = defaultdict(list)
-    for cid, sub in df.groupby("community"):
-        top_users_per_comm[int(cid)] = sub.head(10)["author_id"].tolist()
+    # df is already sorted by suspicion_score, so head(10) takes each community's top users.
+    top_users_per_comm = df.groupby("community").head(10).groupby("community")["author_id"].agg(list)
 
-    comm_df["top_users"] = comm_df["community"].map(lambda c: top_users_per_comm.get(int(c), []))
+    comm_df["top_users"] = comm_df["community"].map(top_users_per_comm)
 
     comm_df = comm_df.sort_values("avg_suspicion", ascending=False)
     comm_df.to_csv(OUT_COMM, index=False)
@@ -211,8 +198,8 @@ def main():
     # 10) Summary json for report writing
     summary = {
         "graph": {
-            "nodes": int(G.number_of_nodes()),
-            "edges": int(G.number_of_edges()),
+            "nodes": len(linked),
+            "edges": len(weight),
             "comm_density_min_edge_weight": COMM_DENSITY_MIN_EDGE_WEIGHT,
         },
         "scoring_weights": {"W_SNA": W_SNA, "W_ARL": W_ARL, "W_COMM": W_COMM},
@@ -1,75 +1,637 @@
 # src/utils_yt.py
+import asyncio
+import errno
+import functools
 import os
+import hashlib
+import json
+import logging
+import re
+import ssl
+import threading
 import time
 import random
-from typing import Any
-from dotenv import load_dotenv
+from datetime import datetime, timedelta, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Optional
+from urllib.parse import parse_qs, parse_qsl, urlencode, urlsplit, urlunsplit
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+import httplib2
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
+from googleapiclient.http import build_http
 
+BACKOFF_BASE = 1.0   # seconds; retry i sleeps uniform(0, min(BACKOFF_CAP, base * 2**i))
+BACKOFF_CAP = 300.0  # seconds
+SLEEP_SLICE = 1.0  # seconds; long waits are re-checked against time.monotonic() this often
 
-def yt_client():
+# Client errors that never succeed on retry; 403 quota / rate-limit reasons are the exception.
+UNRECOVERABLE_STATUSES = {400, 401, 403, 404}
+# Statuses whose retry floor needs no response body: status -> (min seconds, extra jitter).
+# Only other statuses (403 reasons etc.) get their content decoded and scanned.
+STATUS_FLOORS = {429: (20.0, 10.0), 500: (10.0, 10.0), 503: (10.0, 10.0)}
+# Reasons in the body of other statuses, found with one regex scan and normalised to lowercase
+# without spaces ("daily limit exceeded" -> "dailylimitexceeded"), then dispatched on.
+_REASON_RE = re.compile(r"commentsDisabled|quotaExceeded|dailyLimitExceeded|daily limit exceeded|rateLimitExceeded", re.I)
+QUOTA_REASONS = {"quotaexceeded", "dailylimitexceeded"}  # key exhausted until the daily reset
+REASON_FLOORS = {"ratelimitexceeded": (20.0, 10.0)}  # reason -> (min seconds, extra jitter)
+# Network-level failures worth retrying (httplib2's own incl. ServerNotFoundError on DNS hiccups);
+# anything else non-HTTP (ValueError, TypeError, ...) is a bug and raises at once.
+RETRYABLE_ERRORS = (ConnectionError, TimeoutError, ssl.SSLError, httplib2.HttpLib2Error)
+# Other OSErrors are retried only for these transient network errnos.
+RETRYABLE_ERRNOS = {
+    errno.ENETUNREACH, errno.ENETDOWN, errno.ENETRESET, errno.EHOSTUNREACH, errno.EHOSTDOWN,
+    errno.ECONNRESET, errno.ECONNABORTED, errno.ECONNREFUSED, errno.ETIMEDOUT, errno.EPIPE,
+}
+
+# GET responses cached on disk by request; a hit is revalidated with If-None-Match,
+# and a 304 answer returns the stored body.
+CACHE_DIR = ".yt_cache"
+CACHE_TTL = 24 * 3600  # seconds; older entries are refetched without an ETag
+
+# Client-side quota pacing: every attempt draws its unit cost from its key's token bucket, which
+# holds one day of quota and refills at the daily rate, so calls wait here instead of earning 429s.
+QUOTA_PER_DAY = 10_000  # default YouTube Data API quota (units/day)
+QUOTA_COST = {"youtube.search.list": 100}  # units per call; other read methods cost 1
+
+# Daily quota resets at midnight Pacific time. An exhausted key is skipped until then; once every
+# key in YT_API_KEYS is exhausted, calls fail fast.
+QUOTA_RESET_TZ = "America/Los_Angeles"
+
+BATCH_MAX_IDS = 50  # API maximum for id= on videos.list / channels.list (1 quota unit per call)
+
+# .env is read once at import; without python-dotenv, YT_API_KEY(S) must come from the environment.
+try:
+    from dotenv import load_dotenv
     load_dotenv()
-    api_key = os.getenv("YT_API_KEY")
-    if not api_key:
-        raise RuntimeError("Missing YT_API_KEY in .env")
-    return build("youtube", "v3", developerKey=api_key, cache_discovery=False)
+except ImportError:
+    pass
+
+logger = logging.getLogger(__name__)
+
+# One httplib2.Http per worker thread for safe_execute_async; a client's own transport is not thread-safe.
+_local = threading.local()
+
+# OS entropy: forked workers would otherwise share one PRNG state and retry in lockstep.
+_rng = random.SystemRandom()
+
+
+def sleep_for(seconds: float) -> None:
+    """Sleep until time.monotonic() has advanced by `seconds`, in SLEEP_SLICE steps."""
+    until = time.monotonic() + seconds
+    left = seconds
+    while left > 0:
+        time.sleep(min(SLEEP_SLICE, left))
+        left = until - time.monotonic()
+
+
+class TokenBucket:
+    """Thread-safe token bucket; acquire(cost) blocks until `cost` tokens are available."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.ts = time.monotonic()
+        self.lock = threading.Lock()
+
+    def reserve(self, cost: float = 1.0) -> float:
+        """Take `cost` tokens now; returns the seconds to wait before using them."""
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + max(0.0, now - self.ts) * self.rate)
+            self.ts = now
+            # Reserve now (tokens may go negative) so waiters are served in call order.
+            self.tokens -= min(cost, self.burst)
+            return -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+    def refund(self, cost: float = 1.0) -> None:
+        """Hand back tokens from a reservation that will not be used."""
+        with self.lock:
+            self.tokens = min(self.burst, self.tokens + min(cost, self.burst))
+
+    def acquire(self, cost: float = 1.0) -> None:
+        wait = self.reserve(cost)
+        if wait > 0:
+            sleep_for(wait)
+
+
+class ApiKey(TokenBucket):
+    """Quota accounting for one API key: its own bucket, units spent, and breaker reset time."""
+
+    def __init__(self, key: Optional[str]):
+        super().__init__(rate=QUOTA_PER_DAY / 86400, burst=QUOTA_PER_DAY)
+        self.key = key
+        self.used = 0.0
+        self.reset_at = 0.0  # quota circuit breaker: epoch seconds until which the key is skipped
+
+    def reserve(self, cost: float = 1.0) -> float:
+        wait = super().reserve(cost)
+        with self.lock:
+            self.used += cost
+        return wait
+
+    def refund(self, cost: float = 1.0) -> None:
+        super().refund(cost)
+        with self.lock:
+            self.used -= cost
+
+
+# One ApiKey per developer key seen (None: requests sent without one), rotated round-robin.
+_keys: dict = {}
+_next_key = 0
+_quota_lock = threading.Lock()
+
+
+class YTError(RuntimeError):
+    """
+    A YouTube API call that failed for good. status (HTTP code), reason (error_reason token)
+    and retry_after (seconds, from the server or the quota reset) come from the last error;
+    each is None when unknown.
+    """
+
+    def __init__(self, message: str, status: Optional[int] = None, reason: Optional[str] = None,
+                 retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.status = status
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class CommentsDisabled(YTError):
+    """The video has comments turned off; retrying cannot help."""
+
+
+class QuotaExceeded(YTError):
+    """Daily quota is exhausted on every key; no call will succeed before `reset_at` (epoch seconds)."""
+
+    def __init__(self, reset_at: float):
+        self.reset_at = reset_at
+        super().__init__(
+            f"YouTube API daily quota exhausted until {datetime.fromtimestamp(reset_at):%Y-%m-%d %H:%M:%S}",
+            status=403, reason="quotaexceeded", retry_after=max(0.0, reset_at - time.time()),
+        )
+
+
+def api_keys() -> list:
+    """Configured keys: YT_API_KEYS (comma-separated), else the single YT_API_KEY."""
+    raw = os.getenv("YT_API_KEYS") or os.getenv("YT_API_KEY") or ""
+    return list(dict.fromkeys(k.strip() for k in raw.split(",") if k.strip()))
+
+
+def _uri_key(uri: Optional[str]) -> Optional[str]:
+    """The developer key in a request URI (key= query parameter), if any."""
+    if not uri:
+        return None
+    values = parse_qs(urlsplit(uri).query).get("key")
+    return values[0] if values else None
+
+
+def _with_key(uri: str, key: str) -> str:
+    parts = urlsplit(uri)
+    query = [(k, key if k == "key" else v) for k, v in parse_qsl(parts.query, keep_blank_values=True)]
+    return urlunsplit(parts._replace(query=urlencode(query)))
+
+
+def _candidates(key: Optional[str]) -> list:
+    """ApiKey states a request holding `key` may use; caller holds _quota_lock."""
+    names = [None] if key is None else api_keys() or [key]
+    if key not in names:
+        names.append(key)
+    return [_keys.setdefault(k, ApiKey(k)) for k in names]
+
+
+def pick_key(req) -> ApiKey:
+    """
+    ApiKey for req's next attempt. A request built with a developer key is moved to the next
+    live key in round-robin order; raises QuotaExceeded when every key is exhausted.
+    """
+    global _next_key
+    key = _uri_key(getattr(req, "uri", None))
+    now = time.time()
+    with _quota_lock:
+        candidates = _candidates(key)
+        live = [k for k in candidates if k.reset_at <= now]
+        if not live:
+            raise QuotaExceeded(min(k.reset_at for k in candidates))
+        picked = live[_next_key % len(live)]
+        _next_key += 1
+    if picked.key is not None and picked.key != key:
+        req.uri = _with_key(req.uri, picked.key)
+    return picked
+
+
+def next_midnight_pt_epoch(now: Optional[float] = None) -> float:
+    """Epoch seconds of the next midnight in QUOTA_RESET_TZ (fixed UTC-8 without tz data)."""
+    try:
+        tz = ZoneInfo(QUOTA_RESET_TZ)
+    except ZoneInfoNotFoundError:
+        tz = timezone(timedelta(hours=-8))
+    local = datetime.fromtimestamp(time.time() if now is None else now, tz)
+    midnight = datetime.combine(local.date() + timedelta(days=1), datetime.min.time(), tz)
+    return midnight.timestamp()
+
+
+def trip_breaker(key: Optional[str] = None) -> None:
+    """
+    Mark `key` exhausted until the next reset; raises QuotaExceeded once no key is left,
+    otherwise the next attempt goes out on another key.
+    """
+    now = time.time()
+    with _quota_lock:
+        candidates = _candidates(key)
+        state = _keys[key]
+        state.reset_at = max(state.reset_at, next_midnight_pt_epoch())
+        if all(k.reset_at > now for k in candidates):
+            raise QuotaExceeded(min(k.reset_at for k in candidates))
+
+
+def reset_breaker() -> None:
+    """Close the quota breaker on every key (tests, or after a quota increase)."""
+    with _quota_lock:
+        for state in _keys.values():
+            state.reset_at = 0.0
+
+
+def request_cost(req) -> int:
+    return QUOTA_COST.get(getattr(req, "methodId", None), 1)
+
+
+@functools.lru_cache(maxsize=1)
+def yt_client():
+    """Shared YouTube client, built on first call (a missing key is not cached).
+    It holds the first configured key; safe_execute moves requests across YT_API_KEYS.
+    The underlying httplib2 transport is not thread-safe: threads should build their own."""
+    keys = api_keys()
+    if not keys:
+        raise RuntimeError("Missing YT_API_KEY (or YT_API_KEYS) in .env")
+    return build("youtube", "v3", developerKey=keys[0], cache_discovery=False)
+
+
+def is_retryable_error(e: BaseException) -> bool:
+    """Whether a non-HTTP failure is a transient network error worth retrying."""
+    return isinstance(e, RETRYABLE_ERRORS) or (isinstance(e, OSError) and e.errno in RETRYABLE_ERRNOS)
+
+
+def backoff(attempt: int, base: float = BACKOFF_BASE) -> float:
+    """Full-jitter exponential backoff for the given 0-based attempt."""
+    return _rng.uniform(0, min(BACKOFF_CAP, base * 2 ** attempt))
 
 
-def safe_execute(req, retries: int = 8, base_backoff: float = 1.7):
+def error_reason(content: str) -> Optional[str]:
+    """Normalised reason token (see _REASON_RE) from an HttpError body, or None."""
+    m = _REASON_RE.search(content)
+    return m.group(0).lower().replace(" ", "") if m else None
+
+
+def is_recoverable(status: Optional[int], reason: Optional[str]) -> bool:
+    """Whether an HttpError (status + error_reason) is worth retrying."""
+    if status in UNRECOVERABLE_STATUSES:
+        return reason in QUOTA_REASONS or reason in REASON_FLOORS
+    return True
+
+
+def retry_after(resp) -> Optional[float]:
+    """Seconds from a Retry-After header (delta-seconds or HTTP-date), or None."""
+    value = resp.get("retry-after") if hasattr(resp, "get") else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _cache_path(req) -> Optional[str]:
+    if getattr(req, "method", "GET") != "GET" or not getattr(req, "uri", None):
+        return None
+    uri = _with_key(req.uri, "") if _uri_key(req.uri) else req.uri  # same entry whichever key sent it
+    key = hashlib.sha1(uri.encode("utf-8")).hexdigest()
+    return os.path.join(CACHE_DIR, key + ".json")
+
+
+def cache_get(path: Optional[str]) -> Optional[dict]:
+    """Cached {"etag", "stored_at", "body"} for a request path, if present and fresh."""
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if time.time() - entry.get("stored_at", 0) > CACHE_TTL or not entry.get("etag"):
+        return None
+    return entry
+
+
+def cache_put(path: Optional[str], body: Any) -> None:
+    etag = body.get("etag") if isinstance(body, dict) else None
+    if not path or not etag:
+        return
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"etag": etag, "stored_at": time.time(), "body": body}, f, ensure_ascii=False)
+        os.replace(tmp, path)  # atomic: concurrent writers never leave a half-written entry
+    except OSError as e:
+        logger.warning("[Cache] could not store %s: %s", path, e)  # the response itself is still returned
+
+
+def _error_content(e: HttpError) -> str:
+    try:
+        return e.content.decode("utf-8", errors="ignore") if hasattr(e, "content") else str(e)
+    except Exception:
+        return str(e)
+
+
+def http_error_delay(e: HttpError, attempt: int, retries: int, base_backoff: float, max_delay: float):
+    """
+    Log an HttpError and pick the sleep (seconds) before the next attempt: local guesses are
+    capped at max_delay, a server Retry-After is not (the caller's deadline still bounds it).
+    Raises YTError (CommentsDisabled for that reason) when retrying cannot help; an exhausted
+    daily quota trips the key's breaker and raises QuotaExceeded when no other key is left.
+    """
+    status = getattr(e.resp, "status", None)
+    floor = STATUS_FLOORS.get(status)
+    # 429/5xx are classified by status alone; the body is only decoded for them when debugging
+    content = _error_content(e) if floor is None or logger.isEnabledFor(logging.DEBUG) else ""
+
+    # Detect common reasons
+    reason = error_reason(content) if floor is None else None
+    logger.warning("[HttpError] status=%s reason=%s attempt=%d/%d content=%s", status, reason, attempt + 1, retries,
+                   content[:300], extra={"status": status, "reason": reason, "attempt": attempt + 1})
+    if floor is None and (reason == "commentsdisabled" or not is_recoverable(status, reason)):
+        # caller should handle (e.g. except CommentsDisabled); retrying cannot help
+        cls = CommentsDisabled if reason == "commentsdisabled" else YTError
+        raise cls(f"YouTube API request failed: HTTP {status} {reason or ''}".rstrip(), status, reason) from e
+
+    # Exponential backoff with full jitter; the cases below only raise the floor
+    sleep_s = backoff(attempt, base_backoff)
+
+    # Quota exceeded: this key is done until the daily reset; retry at once on another key
+    if reason in QUOTA_REASONS:
+        trip_breaker(_uri_key(getattr(e, "uri", None)))
+        return 0.0
+
+    ra = retry_after(e.resp) if status in (429, 503) else None
+    if ra is not None:
+        # Server-provided cool-down replaces the rate-limit/5xx guesses below, uncapped:
+        # retrying before it runs out only earns another 429
+        return max(min(sleep_s, max_delay), ra)
+    if floor is not None:
+        # Rate limited (429) or transient server error (500/503)
+        sleep_s = max(sleep_s, floor[0] + _rng.uniform(0, floor[1]))
+    elif reason in REASON_FLOORS:
+        # 403 rateLimitExceeded: sleep a bit longer
+        sleep_s = max(sleep_s, REASON_FLOORS[reason][0] + _rng.uniform(0, REASON_FLOORS[reason][1]))
+
+    return min(sleep_s, max_delay)
+
+
+def yt_error(message: str, exc: Optional[BaseException]) -> YTError:
+    """YTError for a call given up on, with status / reason / retry_after taken from its last error."""
+    if not isinstance(exc, HttpError):
+        return YTError(f"{message}. Last error: {exc}", reason=type(exc).__name__ if exc else None)
+    status = getattr(exc.resp, "status", None)
+    reason = error_reason(_error_content(exc))
+    return YTError(f"{message}. Last error: {exc}", status, reason, retry_after(exc.resp))
+
+
+def _within_deadline(t0: float, sleep_s: float, deadline: float, exc: BaseException) -> float:
+    """sleep_s, unless sleeping that long would overrun the deadline: then raises YTError."""
+    if time.monotonic() - t0 + sleep_s > deadline:
+        raise yt_error(f"YouTube API request exceeded its {deadline:.0f}s deadline", exc) from exc
+    return sleep_s
+
+
+def _reserve_within_deadline(key: ApiKey, cost: float, t0: float, deadline: float) -> float:
+    """
+    Reserve `cost` units on key and return the pacing wait. If that wait would overrun the
+    deadline, the units are handed back and YTError is raised (retry_after = the wait).
+    """
+    wait = key.reserve(cost)
+    if time.monotonic() - t0 + wait > deadline:
+        key.refund(cost)
+        raise YTError(f"YouTube API quota pacing needs {wait:.0f}s, past the {deadline:.0f}s deadline",
+                      reason="quotapacing", retry_after=wait)
+    return wait
+
+
+def _revalidate(req, cache: bool, idempotency_key: Optional[str] = None):
+    """(cache path, cached entry) for req; a cached ETag is sent as If-None-Match.
+    An idempotency key is sent as Idempotency-Key on every attempt."""
+    if idempotency_key:
+        req.headers["Idempotency-Key"] = idempotency_key
+    path = _cache_path(req) if cache else None
+    cached = cache_get(path)
+    if cached is not None:
+        req.headers["If-None-Match"] = cached["etag"]
+    return path, cached
+
+
+def safe_execute(
+    req,
+    retries: int = 8,
+    base_backoff: float = BACKOFF_BASE,
+    max_delay: float = 60.0,
+    deadline: float = 900.0,
+    cache: bool = True,
+    idempotency_key: Optional[str] = None,
+):
     """
     Robust execute with:
-    - exponential backoff + jitter
-    - special handling for quotaExceeded / rateLimitExceeded
-    - prints full HttpError reason
+    - exponential backoff with full jitter
+    - fail fast on bad request / auth / not found (YTError; CommentsDisabled for that reason)
+    - round-robin over YT_API_KEYS; quotaExceeded takes a key out until the next midnight
+      Pacific reset and retries on another, and with no key left raises QuotaExceeded
+    - longer floor for rateLimitExceeded
+    - honors Retry-After on 429/503 in full (exempt from max_delay, not from deadline)
+    - paces calls client-side against each key's daily quota (QUOTA_PER_DAY, QUOTA_COST)
+    - each backoff sleep capped at max_delay; the whole call, quota-pacing waits included, at
+      deadline seconds (a pacing wait that would overrun it raises YTError at once)
+      (both measured on time.monotonic(), so clock steps and suspend/resume don't skew them)
+    - GET responses cached by URI and revalidated by ETag (cache=False to bypass)
+    - idempotency_key sent as an Idempotency-Key header on every attempt; for inserts/updates
+      pass one stable uuid4 per logical operation so a retry after a lost ack is not a repeat
+    - logs each HttpError (body decoded only when it decides the retry, or at DEBUG), with
+      status / reason / attempt as record extras
+    - gives up with YTError carrying the last error's status, reason and retry_after
     """
     last_exc = None
+    t0 = time.monotonic()
+    path, cached = _revalidate(req, cache, idempotency_key)
 
     for i in range(retries):
+        key = pick_key(req)
         try:
-            return req.execute()
+            sleep_for(_reserve_within_deadline(key, request_cost(req), t0, deadline))
+            body = req.execute()
+            cache_put(path, body)
+            return body
 
         except HttpError as e:
             last_exc = e
-            status = getattr(e.resp, "status", None)
-            content = ""
-            try:
-                content = e.content.decode("utf-8", errors="ignore") if hasattr(e, "content") else str(e)
-            except Exception:
-                content = str(e)
-
-            msg = f"[HttpError] status={status} attempt={i+1}/{retries} content={content[:300]}"
-            print(msg)
-
-            # Detect common reasons
-            lower = content.lower()
-            if "commentsdisabled" in lower:
-                # caller should handle; here just rethrow to be caught outside
+            if getattr(e.resp, "status", None) == 304 and cached is not None:
+                return cached["body"]
+            sleep_s = http_error_delay(e, i, retries, base_backoff, max_delay)
+            sleep_for(_within_deadline(t0, sleep_s, deadline, e))
+            continue
+
+        except (*RETRYABLE_ERRORS, OSError) as e:
+            if not is_retryable_error(e):
                 raise
+            last_exc = e
+            sleep_s = min(backoff(i, base_backoff), max_delay)
+            logger.warning("[Error] attempt=%d/%d %s: %s  -> sleeping %.1fs", i + 1, retries, type(e).__name__, e, sleep_s,
+                           extra={"status": None, "reason": type(e).__name__, "attempt": i + 1})
+            sleep_for(_within_deadline(t0, sleep_s, deadline, e))
+            continue
+
+    raise yt_error("YouTube API request failed after retries", last_exc) from last_exc
 
-            # Exponential backoff with jitter
-            sleep_s = (base_backoff ** i) + random.uniform(0, 1.0)
 
-            # If quota exceeded, sleep longer (minutes)
-            if "quotaexceeded" in lower or "daily limit exceeded" in lower:
-                sleep_s = max(sleep_s, 60 * 10)  # 10 minutes
+def _execute_local(req):
+    """req.execute() on this thread's own transport (API-key requests: the key travels in the URI)."""
+    http = getattr(_local, "http", None)
+    if http is None:
+        http = _local.http = build_http()
+    return req.execute(http=http)
 
-            # If rate limited, sleep a bit longer
-            if "ratelimitexceeded" in lower or status in (429,):
-                sleep_s = max(sleep_s, 20 + random.uniform(0, 10))
 
-            # Transient server errors
-            if status in (500, 503):
-                sleep_s = max(sleep_s, 10 + random.uniform(0, 10))
+async def safe_execute_async(
+    req,
+    retries: int = 8,
+    base_backoff: float = BACKOFF_BASE,
+    max_delay: float = 60.0,
+    deadline: float = 900.0,
+    cache: bool = True,
+    idempotency_key: Optional[str] = None,
+):
+    """
+    safe_execute for asyncio callers: same classification, backoff, quota pacing and breaker,
+    cache and idempotency key, but every wait is an asyncio.sleep and req.execute() runs in a
+    worker thread, so many requests can share one event loop.
+    httplib2 transports are not thread-safe, so each worker thread executes on its own
+    build_http() instance rather than the client's; this suits API-key clients like yt_client(),
+    not OAuth clients whose credentials live on their transport.
+    """
+    last_exc = None
+    t0 = time.monotonic()
+    path, cached = _revalidate(req, cache, idempotency_key)
+
+    for i in range(retries):
+        key = pick_key(req)
+        try:
+            await asyncio.sleep(_reserve_within_deadline(key, request_cost(req), t0, deadline))
+            body = await asyncio.to_thread(_execute_local, req)
+            cache_put(path, body)
+            return body
 
-            time.sleep(sleep_s)
+        except HttpError as e:
+            last_exc = e
+            if getattr(e.resp, "status", None) == 304 and cached is not None:
+                return cached["body"]
+            sleep_s = http_error_delay(e, i, retries, base_backoff, max_delay)
+            await asyncio.sleep(_within_deadline(t0, sleep_s, deadline, e))
             continue
 
-        except Exception as e:
+        except (*RETRYABLE_ERRORS, OSError) as e:
+            if not is_retryable_error(e):
+                raise
             last_exc = e
-            sleep_s = (base_backoff ** i) + random.uniform(0, 1.0)
-            print(f"[Error] attempt={i+1}/{retries} {type(e).__name__}: {e}  -> sleeping {sleep_s:.1f}s")
-            time.sleep(sleep_s)
+            sleep_s = min(backoff(i, base_backoff), max_delay)
+            logger.warning("[Error] attempt=%d/%d %s: %s  -> sleeping %.1fs", i + 1, retries, type(e).__name__, e, sleep_s,
+                           extra={"status": None, "reason": type(e).__name__, "attempt": i + 1})
+            await asyncio.sleep(_within_deadline(t0, sleep_s, deadline, e))
             continue
 
-    raise RuntimeError(f"YouTube API request failed after retries. Last error: {last_exc}")
+    raise yt_error("YouTube API request failed after retries", last_exc) from last_exc
+
+
+def safe_execute_batch(client, resource: str, part: str, ids, chunk: int = BATCH_MAX_IDS, **kwargs) -> list:
+    """
+    Items for many IDs via `resource`.list ("videos", "channels", ...), sending up to
+    `chunk` comma-joined IDs per request instead of one request per ID.
+    Duplicate IDs are fetched once; extra kwargs go to safe_execute.
+    """
+    ids = list(dict.fromkeys(i for i in ids if i))
+    chunk = max(1, min(chunk, BATCH_MAX_IDS))
+    items = []
+    for start in range(0, len(ids), chunk):
+        batch = ids[start:start + chunk]
+        req = getattr(client, resource)().list(part=part, id=",".join(batch), maxResults=len(batch))
+        items.extend(safe_execute(req, **kwargs).get("items", []))
+    return items
+
+
+def load_page_token(state_path: Optional[str]) -> Optional[str]:
+    """Page token saved by safe_paginate at state_path, or None to start from the first page."""
+    if not state_path or not os.path.exists(state_path):
+        return None
+    try:
+        with open(state_path, "r", encoding="utf-8") as f:
+            return json.load(f).get("page_token")
+    except (OSError, ValueError) as e:
+        logger.warning("[Paginate] unreadable state %s, starting over: %s", state_path, e)
+        return None
+
+
+def save_page_token(state_path: Optional[str], page_token: Optional[str]) -> None:
+    """Persist page_token at state_path atomically; None (pagination finished) removes the file."""
+    if not state_path:
+        return
+    if page_token is None:
+        if os.path.exists(state_path):
+            os.remove(state_path)
+        return
+    tmp = f"{state_path}.{os.getpid()}.tmp"
+    os.makedirs(os.path.dirname(state_path) or ".", exist_ok=True)
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump({"page_token": page_token, "saved_at": time.time()}, f)
+    os.replace(tmp, state_path)
+
+
+def safe_paginate(req_factory, state_path: Optional[str] = None, **kwargs):
+    """
+    Yield response pages of req_factory(page_token) (None for the first page) through safe_execute.
+    With state_path, the next page token is saved there once the caller has consumed a page,
+    so a run stopped by QuotaExceeded or any other error resumes from that page on restart
+    instead of paying for the earlier pages again (a page interrupted mid-processing is refetched).
+    The file is removed when the last page is done. Extra kwargs go to safe_execute.
+    """
+    page_token = load_page_token(state_path)
+    if page_token:
+        logger.info("[Paginate] resuming %s at page token %s", state_path, page_token)
+    while True:
+        resp = safe_execute(req_factory(page_token), **kwargs)
+        yield resp
+        page_token = resp.get("nextPageToken")
+        save_page_token(state_path, page_token)
+        if not page_token:
+            return
+
+
+def iter_channel_videos(client, channel_id: str, state_path: Optional[str] = None, **kwargs):
+    """
+    Yield the video IDs a channel has uploaded, newest first, via its uploads playlist:
+    one channels.list (1 unit) plus one playlistItems.list per 50 videos (1 unit each),
+    instead of search.list?channelId= at 100 units per page. state_path makes the scan
+    resumable (see safe_paginate); extra kwargs go to safe_execute.
+    """
+    items = safe_execute(client.channels().list(part="contentDetails", id=channel_id), **kwargs).get("items", [])
+    uploads = items[0].get("contentDetails", {}).get("relatedPlaylists", {}).get("uploads") if items else None
+    if not uploads:
+        return
+    pages = safe_paginate(lambda page_token: client.playlistItems().list(
+        part="contentDetails", playlistId=uploads, maxResults=BATCH_MAX_IDS, pageToken=page_token,
+    ), state_path, **kwargs)
+    for resp in pages:
+        for item in resp.get("items", []):
+            video_id = item.get("contentDetails", {}).get("videoId")
+            if video_id:
+                yield video_id